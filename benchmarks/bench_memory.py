@@ -0,0 +1,94 @@
+"""Memory used by a large synthetic ConnectionList.
+
+Compares the slotted models with dict-backed replicas of the previous
+classes. Run from the repository root with ``python -m benchmarks.bench_memory``.
+"""
+import tracemalloc
+
+import pendulum
+
+from schiene2.models import ConnectionList
+
+STATIONS = ['Köln Hbf', 'Frankfurt Hbf', 'Freiburg Hbf', 'Hinterzarten', 'Berlin Hbf', 'Bergisch Gladbach']
+
+
+class PlainStation:
+    def __init__(self, name):
+        self.name = name
+
+
+class PlainDepartureOrArrival:
+    def __init__(self, station, time, track=None, actual_time=None):
+        self.station = station
+        self.time = time
+        self.track = track
+        self.actual_time = actual_time or time
+
+
+class PlainConnection:
+    def __init__(self, detail_url, origin, destination, transfers, products):
+        self.detail_url = detail_url
+        self.origin = origin
+        self.destination = destination
+        self.transfers = transfers
+        self.products = products
+
+
+def synthetic_rows(count):
+    start = pendulum.create(2017, 12, 17, 5, 0, tz='Europe/Berlin')
+    for index in range(count):
+        departure = start.add(minutes=index % 1000)
+        yield {
+            'detail_url': 'http://mobile.bahn.de/bin/mobil/query.exe/dox?co=C0-{}'.format(index),
+            'transfers': index % 3,
+            'products': {'ICE', 'S'},
+            'origin': {
+                'station': ''.join(STATIONS[index % len(STATIONS)]),
+                'time': departure,
+                'actual_time': departure,
+            },
+            'destination': {
+                'station': ''.join(STATIONS[(index + 1) % len(STATIONS)]),
+                'time': departure.add(hours=2),
+                'actual_time': departure.add(hours=2),
+            },
+        }
+
+
+def build_plain(rows):
+    return [
+        PlainConnection(
+            detail_url=row['detail_url'],
+            origin=PlainDepartureOrArrival(PlainStation(row['origin']['station']), row['origin']['time'],
+                                           actual_time=row['origin']['actual_time']),
+            destination=PlainDepartureOrArrival(PlainStation(row['destination']['station']),
+                                                row['destination']['time'],
+                                                actual_time=row['destination']['actual_time']),
+            transfers=row['transfers'],
+            products=row['products']
+        )
+        for row in rows
+    ]
+
+
+def measure(build, rows):
+    tracemalloc.start()
+    before = tracemalloc.get_traced_memory()[0]
+    result = build(rows)
+    after = tracemalloc.get_traced_memory()[0]
+    tracemalloc.stop()
+    return result, after - before
+
+
+def main(count=100000):
+    rows = list(synthetic_rows(count))
+    _, plain = measure(build_plain, rows)
+    _, slotted = measure(ConnectionList.from_list, [dict(row, origin=dict(row['origin']),
+                                                         destination=dict(row['destination'])) for row in rows])
+    print('{} connections, model objects only'.format(count))
+    print('{:<12} {:>8.1f} MiB  {:>5.0f} bytes per connection'.format('dict-backed', plain / 2 ** 20, plain / count))
+    print('{:<12} {:>8.1f} MiB  {:>5.0f} bytes per connection'.format('slotted', slotted / 2 ** 20, slotted / count))
+
+
+if __name__ == '__main__':
+    main()
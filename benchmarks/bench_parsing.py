@@ -0,0 +1,55 @@
+"""Compare HTML parsing backends on the recorded cassettes.
+
+Run from the repository root with ``python -m benchmarks.bench_parsing``.
+"""
+import timeit
+
+from bs4 import BeautifulSoup
+
+from benchmarks.cassettes import ambiguous_pages, detail_pages, search_pages
+from schiene2 import mobile_page
+from schiene2.mobile_page import ConnectionListParser, DetailParser
+
+
+def parse_unstrained(searches, details, ambiguous):
+    for html, dt in searches:
+        parser = ConnectionListParser.from_html('', dt)
+        parser.soup = BeautifulSoup(html, 'html.parser')
+        parser.connections
+    for html in details:
+        parser = DetailParser.from_html('')
+        parser.soup = BeautifulSoup(html, 'html.parser')
+        parser.journeys()
+    for html in ambiguous:
+        BeautifulSoup(html, 'html.parser').find('form')
+
+
+def parse(searches, details, ambiguous):
+    for html, dt in searches:
+        ConnectionListParser.from_html(html, dt).connections
+    for html in details:
+        DetailParser.from_html(html).journeys()
+    for html in ambiguous:
+        ConnectionListParser.ambiguous_entry_form(html)
+
+
+def best_of(func, *args, number=20, repeat=5):
+    return min(timeit.repeat(lambda: func(*args), number=number, repeat=repeat)) / number
+
+
+def main():
+    pages = search_pages(), detail_pages(), ambiguous_pages()
+    baseline = best_of(parse_unstrained, *pages)
+    print('{:<28} {:>8.2f} ms'.format('html.parser, full tree', baseline * 1000))
+    for backend in ('html.parser', 'lxml'):
+        try:
+            mobile_page.set_parser_backend(backend)
+        except ValueError:
+            print('{:<28} not installed'.format(backend))
+            continue
+        duration = best_of(parse, *pages)
+        print('{:<28} {:>8.2f} ms  {:.1f}x'.format(backend + ', strained', duration * 1000, baseline / duration))
+
+
+if __name__ == '__main__':
+    main()
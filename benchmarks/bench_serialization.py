@@ -0,0 +1,68 @@
+"""Dump and load speed and size of the binary format against pickle and JSON.
+
+Uses the synthetic ConnectionList of ``bench_memory``. Run from the
+repository root with ``python -m benchmarks.bench_serialization``.
+"""
+import json
+import pickle
+import timeit
+
+import pendulum
+
+from benchmarks.bench_memory import synthetic_rows
+from schiene2 import serialization
+from schiene2.models import ConnectionList
+
+
+def stop_to_dict(stop):
+    return {
+        'station': stop.station.name,
+        'time': stop.time.isoformat(),
+        'track': stop.track,
+        'actual_time': stop.actual_time.isoformat(),
+    }
+
+
+def json_dumps(connections):
+    return json.dumps([
+        {
+            'detail_url': connection.detail_url,
+            'origin': stop_to_dict(connection.origin),
+            'destination': stop_to_dict(connection.destination),
+            'transfers': connection.transfers,
+            'products': sorted(connection.products),
+        }
+        for connection in connections
+    ]).encode('utf-8')
+
+
+def json_loads(data):
+    rows = json.loads(data.decode('utf-8'))
+    for row in rows:
+        for stop in (row['origin'], row['destination']):
+            stop['time'] = pendulum.parse(stop['time'])
+            stop['actual_time'] = pendulum.parse(stop['actual_time'])
+        row['products'] = set(row['products'])
+    return ConnectionList.from_list(rows)
+
+
+FORMATS = (
+    ('binary', serialization.dumps, serialization.loads),
+    ('pickle', lambda connections: pickle.dumps(connections, pickle.HIGHEST_PROTOCOL), pickle.loads),
+    ('json', json_dumps, json_loads),
+)
+
+
+def main(count=20000, repeat=3):
+    connections = ConnectionList.from_list(list(synthetic_rows(count)))
+    print('{} connections'.format(count))
+    print('{:<8} {:>10} {:>10} {:>10}'.format('format', 'size KiB', 'dump ms', 'load ms'))
+    for name, dumps, loads in FORMATS:
+        data = dumps(connections)
+        dump = min(timeit.repeat(lambda: dumps(connections), number=1, repeat=repeat))
+        load = min(timeit.repeat(lambda: loads(data), number=1, repeat=repeat))
+        print('{:<8} {:>10.1f} {:>10.1f} {:>10.1f}'.format(name, len(data) / 1024, dump * 1000, load * 1000))
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,62 @@
+"""Per-row cost of converting the timestrings of a result page.
+
+Run from the repository root with ``python -m benchmarks.bench_time_conversion``.
+"""
+import timeit
+
+import pendulum
+
+from benchmarks.cassettes import search_pages
+from schiene2.mobile_page import ConnectionListParser, ConnectionRowParser
+
+
+def legacy_timestring_to_pendulum(parser, timestring):
+    datetimestring = "{} {}".format(parser.datestring, timestring)
+    datetime = pendulum.parse(datetimestring, year_first=False, day_first=True, tz='Europe/Berlin')
+    if timestring < parser.first_timestring:
+        datetime = datetime.add(days=1)
+    return datetime
+
+
+def row_timestrings(parser):
+    timestrings = []
+    for row in parser.connection_rows:
+        row_parser = ConnectionRowParser(row)
+        timestrings.append((
+            row_parser.origin_time,
+            row_parser.actual_origin_time,
+            row_parser.destination_time,
+            row_parser.actual_destination_time
+        ))
+    return timestrings
+
+
+def convert_legacy(pages):
+    for parser, rows in pages:
+        for row in rows:
+            for timestring in row:
+                legacy_timestring_to_pendulum(parser, timestring)
+
+
+def convert(pages):
+    for parser, rows in pages:
+        parser._datetimes = {}
+        for row in rows:
+            for timestring in row:
+                parser.timestring_to_pendulum(timestring)
+
+
+def main():
+    pages = []
+    for html, dt in search_pages():
+        parser = ConnectionListParser.from_html(html, dt)
+        pages.append((parser, row_timestrings(parser)))
+    row_count = sum(len(rows) for _, rows in pages)
+
+    for name, func in (('pendulum.parse', convert_legacy), ('memoized arithmetic', convert)):
+        duration = min(timeit.repeat(lambda: func(pages), number=50, repeat=5)) / 50
+        print('{:<20} {:>8.1f} us per row'.format(name, duration / row_count * 1e6))
+
+
+if __name__ == '__main__':
+    main()
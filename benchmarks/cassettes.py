@@ -0,0 +1,34 @@
+import json
+import os
+
+import pendulum
+
+CASSETTE_DIR = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), 'tests', 'cassettes')
+
+
+def load_cassette(name):
+    with open(os.path.join(CASSETTE_DIR, '{}.json'.format(name))) as f:
+        return [
+            interaction['response']['body']['string']
+            for interaction in json.load(f)['http_interactions']
+        ]
+
+
+def search_pages():
+    functional = load_cassette('tests.test_functional.test_functional')
+    mobile_page = load_cassette('tests.test_mobile_page.TestConnectionListParser')
+    return [
+        (functional[0], pendulum.create(2017, 12, 17, 14, 30, tz='Europe/Berlin')),
+        (functional[2], pendulum.create(2017, 12, 17, 14, 52, tz='Europe/Berlin')),
+        (mobile_page[1], pendulum.create(2017, 12, 15, 14, 2, tz='Europe/Berlin')),
+        (mobile_page[2], pendulum.create(2017, 12, 20, 20, 11, tz='Europe/Berlin')),
+    ]
+
+
+def detail_pages():
+    functional = load_cassette('tests.test_functional.test_functional')
+    return [functional[1], functional[3]]
+
+
+def ambiguous_pages():
+    return load_cassette('tests.test_mobile_page.TestConnectionListParser')[:1]
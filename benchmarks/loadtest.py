@@ -0,0 +1,107 @@
+"""Load test of ConnectionList.search and get_details against the mock server.
+
+Starts a local ``MockServer`` and runs searches followed by a details
+request for the first result at each concurrency level, reporting
+throughput and p50/p99 latency per operation. Run from the repository
+root with::
+
+    python -m benchmarks.loadtest --concurrency 1 4 16 --operations 200 --latency 0.05
+"""
+from concurrent.futures import ThreadPoolExecutor
+import argparse
+import itertools
+import statistics
+import threading
+import time
+
+import pendulum
+
+from benchmarks.mock_server import HUBS, MockServer
+from schiene2.client import Client
+from schiene2.models import ConnectionList
+
+
+def percentile(timings, percent):
+    timings = sorted(timings)
+    return timings[min(len(timings) - 1, int(len(timings) * percent / 100))]
+
+
+def summarize(timings):
+    if not timings:
+        return {'count': 0}
+    return {
+        'count': len(timings),
+        'mean': statistics.mean(timings),
+        'p50': percentile(timings, 50),
+        'p99': percentile(timings, 99),
+    }
+
+
+def run_level(server, concurrency, operations, dt):
+    client = Client(session=server.session(pool_size=concurrency), pool_size=concurrency)
+    pairs = itertools.cycle(itertools.permutations(HUBS, 2))
+    timings = {'search': [], 'get_details': []}
+    errors = []
+    lock = threading.Lock()
+
+    def operation(pair):
+        try:
+            started = time.perf_counter()
+            connections = ConnectionList.search(*pair, time=dt, client=client)
+            searched = time.perf_counter()
+            connections[0].get_details(client)
+            finished = time.perf_counter()
+        except Exception as e:
+            with lock:
+                errors.append(e)
+            return
+        with lock:
+            timings['search'].append(searched - started)
+            timings['get_details'].append(finished - searched)
+
+    started = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=concurrency) as executor:
+        list(executor.map(operation, [next(pairs) for _ in range(operations)]))
+    elapsed = time.perf_counter() - started
+    return {
+        'concurrency': concurrency,
+        'operations': operations,
+        'errors': len(errors),
+        'elapsed': elapsed,
+        'throughput': (operations - len(errors)) / elapsed,
+        'search': summarize(timings['search']),
+        'get_details': summarize(timings['get_details']),
+    }
+
+
+def run(concurrency_levels=(1, 4, 16), operations=100, latency=0.0, connections=5):
+    dt = pendulum.now('Europe/Berlin')
+    with MockServer(latency=latency, connections=connections) as server:
+        return [run_level(server, concurrency, operations, dt) for concurrency in concurrency_levels]
+
+
+def report(results):
+    print('{:>5} {:>8} {:>7} {:>10}  {:>9} {:>9}  {:>9} {:>9}'.format(
+        'conc', 'ops', 'errors', 'ops/s', 'search50', 'search99', 'detail50', 'detail99'))
+    for result in results:
+        print('{:>5} {:>8} {:>7} {:>10.1f}  {:>7.1f}ms {:>7.1f}ms  {:>7.1f}ms {:>7.1f}ms'.format(
+            result['concurrency'], result['operations'], result['errors'], result['throughput'],
+            result['search'].get('p50', 0) * 1000, result['search'].get('p99', 0) * 1000,
+            result['get_details'].get('p50', 0) * 1000, result['get_details'].get('p99', 0) * 1000,
+        ))
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--concurrency', type=int, nargs='+', default=[1, 4, 16])
+    parser.add_argument('--operations', type=int, default=100, help='search and details pairs per level')
+    parser.add_argument('--latency', type=float, default=0.0, help='simulated server latency in seconds')
+    parser.add_argument('--connections', type=int, default=5, help='connections per result page')
+    args = parser.parse_args(argv)
+    results = run(args.concurrency, args.operations, args.latency, args.connections)
+    report(results)
+    return 1 if any(result['errors'] for result in results) else 0
+
+
+if __name__ == '__main__':
+    raise SystemExit(main())
@@ -0,0 +1,257 @@
+"""Local stand-in for mobile.bahn.de serving generated result and detail pages.
+
+The pages carry the markup ``ConnectionListParser`` and ``DetailParser``
+read and are generated deterministically from the query, so the same
+search always returns the same connections. Use it from a client with::
+
+    with MockServer(latency=0.05) as server:
+        client = Client(session=server.session())
+        ConnectionList.search('Köln Hbf', 'Freiburg Hbf', client=client)
+
+Run it standalone with ``python -m benchmarks.mock_server --port 8080``.
+"""
+from datetime import datetime, timedelta
+from html import escape
+from http.server import BaseHTTPRequestHandler, HTTPServer
+from socketserver import ThreadingMixIn
+from urllib.parse import parse_qsl, urlencode, urlsplit
+import argparse
+import random
+import threading
+import time
+import zlib
+
+import requests
+from requests.adapters import HTTPAdapter
+
+from schiene2.mobile_page import SEARCH_URL
+
+PATH = urlsplit(SEARCH_URL).path
+HUBS = ['Frankfurt(Main)Hbf', 'Köln Hbf', 'Mannheim Hbf', 'Hannover Hbf', 'Nürnberg Hbf', 'Leipzig Hbf',
+        'Erfurt Hbf', 'Kassel-Wilhelmshöhe', 'Fulda', 'Würzburg Hbf']
+TRAINS = [('ICE', 500, 1999), ('IC', 2000, 2999), ('RE', 3000, 4999), ('S', 1, 99)]
+WEEKDAYS = ['Mo', 'Di', 'Mi', 'Do', 'Fr', 'Sa', 'So']
+
+
+def timetable(origin, destination, dt, count=5):
+    # connections departing after dt, seeded by the query so every request for it gets the same answer
+    seed = zlib.crc32('{}|{}|{:%Y-%m-%d %H:%M}'.format(origin, destination, dt).encode('utf-8'))
+    rng = random.Random(seed)
+    connections = []
+    departure = dt
+    for index in range(count):
+        departure += timedelta(minutes=rng.randint(5, 40))
+        transfers = rng.choice([0, 1, 1, 2])
+        stations = [origin] + rng.sample([_ for _ in HUBS if _ not in (origin, destination)], transfers) + \
+            [destination]
+        legs = []
+        leg_departure = departure
+        for leg_origin, leg_destination in zip(stations, stations[1:]):
+            train_type, low, high = rng.choice(TRAINS)
+            arrival = leg_departure + timedelta(minutes=rng.randint(20, 150))
+            legs.append({
+                'train': '{} {}'.format(train_type, rng.randint(low, high)),
+                'departure': stop(rng, leg_origin, leg_departure),
+                'arrival': stop(rng, leg_destination, arrival),
+            })
+            leg_departure = arrival + timedelta(minutes=rng.randint(4, 20))
+        connections.append({'index': index, 'transfers': transfers, 'legs': legs})
+    return connections
+
+
+def stop(rng, station, time):
+    delay = rng.choice([0, 0, 0, 0, 1, 2, 5, 12, 30])
+    return {
+        'station': station,
+        'time': time,
+        'actual_time': time + timedelta(minutes=delay) if rng.random() < 0.8 else None,
+        'track': str(rng.randint(1, 20)),
+    }
+
+
+def products(connection):
+    return ', '.join(sorted({leg['train'].split()[0] for leg in connection['legs']}))
+
+
+def hhmm(time):
+    return '{:%H:%M}'.format(time)
+
+
+def result_page(base_url, origin, destination, dt, count=5):
+    connections = timetable(origin, destination, dt, count)
+    rows = []
+    for connection in connections:
+        first, last = connection['legs'][0]['departure'], connection['legs'][-1]['arrival']
+        detail_url = '{}?{}'.format(base_url, urlencode({
+            'S': origin, 'Z': destination, 'date': '{:%d.%m.%y}'.format(dt), 'time': hhmm(dt),
+            'co': 'C0-{}'.format(connection['index']),
+        }))
+        delays = '<span class="{}">{}</span><br /><span class="{}">{}</span>'.format(
+            'okmsg', hhmm(first['actual_time']) if first['actual_time'] else '',
+            'red' if last['actual_time'] and last['actual_time'] > last['time'] else 'okmsg',
+            hhmm(last['actual_time']) if last['actual_time'] else '',
+        )
+        duration = last['time'] - first['time']
+        rows.append(
+            '<tr class=" scheduledCon"><td class="overview timelink"><a href="{url}"><span class="bold">{dep}</span>'
+            '<br /><span class="bold">{arr}</span></a></td><td class="overview tprt">{delays}</td>'
+            '<td class="overview">{transfers}<br />{hours}:{minutes:02}</td>'
+            '<td class="overview iphonepfeil" >{products}<br /></td></tr>'.format(
+                url=escape(detail_url), dep=hhmm(first['time']), arr=hhmm(last['time']), delays=delays,
+                transfers=connection['transfers'], hours=duration.seconds // 3600,
+                minutes=duration.seconds // 60 % 60, products=products(connection)
+            )
+        )
+    later = connections[-1]['legs'][0]['departure']['time'] + timedelta(minutes=1)
+    later_url = '{}?{}'.format(base_url, urlencode({
+        'S': origin, 'Z': destination, 'date': '{:%d.%m.%y}'.format(later), 'time': hhmm(later), 'e': 1,
+    }))
+    return (
+        '<html><body><div class="rline"><div class="stdpadding editBtnCon paddingleft " >'
+        '<span class="bold">{origin}</span>\n-\n<span class="bold">{destination}</span><br />'
+        '<span class="grey">{weekday}, {date:%d.%m.%Y}</span><br /></div></div>'
+        '<table class="ovTable clicktable ">{rows}</table>'
+        '<div class="bline"><a class="nounderline" href="{later}"> Sp&#228;ter</a></div>'
+        '</body></html>'
+    ).format(origin=escape(origin), destination=escape(destination), weekday=WEEKDAYS[dt.weekday()], date=dt,
+             rows=''.join(rows), later=escape(later_url))
+
+
+def stop_html(css_class, stop, prefix, station_first):
+    delay = ' <span class="delay">{}</span>'.format(hhmm(stop['actual_time'])) if stop['actual_time'] else ''
+    time = '{} {}{}  Gl. {}\n<br />\n'.format(prefix, hhmm(stop['time']), delay, stop['track'])
+    station = '<span class="bold">{}</span><br />\n'.format(escape(stop['station']))
+    return '<div class="rline haupt {}">\n{}</div>\n'.format(css_class, station + time if station_first
+                                                             else time + station)
+
+
+def detail_page(origin, destination, dt, co, count=5):
+    index = int(co.rsplit('-', 1)[-1])
+    connection = timetable(origin, destination, dt, count)[index]
+    legs = connection['legs']
+    first, last = legs[0]['departure'], legs[-1]['arrival']
+    parts = ['<html><body><span class="querysummary2" id="dtlOpen_2">\n{}, {:%d.%m.%y}, {}\n-\n{}\n</span>\n'.format(
+        WEEKDAYS[first['time'].weekday()], first['time'], hhmm(first['time']), hhmm(last['time']))]
+    for position, leg in enumerate(legs):
+        parts.append(stop_html('routeStart' if position == 0 else 'stationDark routeChange', leg['departure'],
+                               'ab', True))
+        parts.append('<div class="rline haupt mot"><div class="motSection"><a href="#" class="flaparrow">'
+                     '<span class="bold">\n{}\n</span></a></div></div>\n'.format(leg['train']))
+        parts.append(stop_html('routeEnd' if position == len(legs) - 1 else 'routeChange', leg['arrival'],
+                               'an', False))
+    parts.append('</body></html>')
+    return ''.join(parts)
+
+
+class Handler(BaseHTTPRequestHandler):
+    protocol_version = 'HTTP/1.1'
+    # headers and body are written separately, with Nagle's algorithm every keep-alive response would wait for a
+    # delayed ack
+    disable_nagle_algorithm = True
+
+    def do_GET(self):
+        url = urlsplit(self.path)
+        params = dict(parse_qsl(url.query))
+        time.sleep(self.server.latency)
+        with self.server.lock:
+            self.server.requests += 1
+        try:
+            dt = datetime.strptime('{} {}'.format(params['date'], params['time']), '%d.%m.%y %H:%M')
+            if url.path != PATH:
+                raise KeyError(url.path)
+            if 'co' in params:
+                body = detail_page(params['S'], params['Z'], dt, params['co'], self.server.connections)
+            else:
+                body = result_page(self.server.url + PATH, params['S'], params['Z'], dt, self.server.connections)
+        except (KeyError, ValueError):
+            self.send_error(404)
+            return
+        body = body.encode('utf-8')
+        self.send_response(200)
+        self.send_header('Content-Type', 'text/html; charset=utf-8')
+        self.send_header('Content-Length', str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, format, *args):
+        pass
+
+
+class ThreadingHTTPServer(ThreadingMixIn, HTTPServer):
+    # http.server only has this from Python 3.7 on
+    daemon_threads = True
+
+
+class RedirectAdapter(HTTPAdapter):
+    # sends requests for the real site to the mock server
+    def __init__(self, base_url, **kwargs):
+        self.base_url = base_url
+        super(RedirectAdapter, self).__init__(**kwargs)
+
+    def send(self, request, **kwargs):
+        url = urlsplit(request.url)
+        request.url = '{}{}?{}'.format(self.base_url, url.path, url.query)
+        return super(RedirectAdapter, self).send(request, **kwargs)
+
+
+class MockServer:
+    def __init__(self, latency=0.0, connections=5, host='127.0.0.1', port=0):
+        self.httpd = ThreadingHTTPServer((host, port), Handler)
+        self.httpd.latency = latency
+        self.httpd.connections = connections
+        self.httpd.requests = 0
+        self.httpd.lock = threading.Lock()
+        self.httpd.url = self.url
+        self._thread = None
+
+    @property
+    def url(self):
+        host, port = self.httpd.server_address[:2]
+        return 'http://{}:{}'.format(host, port)
+
+    @property
+    def requests(self):
+        return self.httpd.requests
+
+    def session(self, pool_size=10):
+        session = requests.Session()
+        adapter = HTTPAdapter(pool_connections=pool_size, pool_maxsize=pool_size)
+        session.mount('http://', adapter)
+        session.mount('{}://{}/'.format(*urlsplit(SEARCH_URL)[:2]),
+                      RedirectAdapter(self.url, pool_connections=pool_size, pool_maxsize=pool_size))
+        return session
+
+    def start(self):
+        self._thread = threading.Thread(target=self.httpd.serve_forever, name='mock-server', daemon=True)
+        self._thread.start()
+        return self
+
+    def stop(self):
+        self.httpd.shutdown()
+        self.httpd.server_close()
+        self._thread.join()
+
+    def __enter__(self):
+        return self.start()
+
+    def __exit__(self, exc_type, exc_val, exc_tb):
+        self.stop()
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--host', default='127.0.0.1')
+    parser.add_argument('--port', type=int, default=8080)
+    parser.add_argument('--latency', type=float, default=0.0, help='seconds to wait before every response')
+    parser.add_argument('--connections', type=int, default=5, help='connections per result page')
+    args = parser.parse_args(argv)
+    server = MockServer(args.latency, args.connections, args.host, args.port)
+    print('serving on {}{}'.format(server.url, PATH))
+    try:
+        server.httpd.serve_forever()
+    except KeyboardInterrupt:
+        server.httpd.server_close()
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,191 @@
+"""Offline benchmark suite replaying the recorded cassettes.
+
+Run from the repository root::
+
+    python -m benchmarks.run --output benchmark.json
+    python -m benchmarks.run --compare benchmark.json
+
+``--compare`` exits with status 1 if any benchmark got slower than the
+saved results by more than ``--tolerance``.
+"""
+from collections import OrderedDict
+import argparse
+import json
+import platform
+import statistics
+import sys
+import time
+import timeit
+
+import pendulum
+
+from benchmarks.cassettes import ambiguous_pages, detail_pages, search_pages
+from schiene2 import __version__
+from schiene2.client import Client
+from schiene2.mobile_page import ConnectionListParser, DetailParser
+from schiene2.models import ConnectionDetails, ConnectionList
+from tests.replay import ReplaySession
+
+BENCHMARKS = OrderedDict()
+
+
+def benchmark(name):
+    def decorator(func):
+        BENCHMARKS[name] = func
+        return func
+    return decorator
+
+
+@benchmark('parse_search_pages')
+def parse_search_pages():
+    pages = search_pages()
+
+    def run():
+        for html, dt in pages:
+            ConnectionListParser.from_html(html, dt).connection_rows
+    return run
+
+
+@benchmark('parse_detail_pages')
+def parse_detail_pages():
+    pages = detail_pages()
+
+    def run():
+        for html in pages:
+            DetailParser.from_html(html).soup
+    return run
+
+
+@benchmark('parse_ambiguous_pages')
+def parse_ambiguous_pages():
+    pages = ambiguous_pages()
+
+    def run():
+        for html in pages:
+            ConnectionListParser.ambiguous_entry_form(html)
+    return run
+
+
+@benchmark('time_conversion')
+def time_conversion():
+    parsers = [ConnectionListParser.from_html(html, dt) for html, dt in search_pages()]
+    timestrings = ['{:02}:{:02}'.format(hour, minute) for hour in range(24) for minute in range(0, 60, 7)]
+
+    def run():
+        for parser in parsers:
+            parser._datetimes = {}
+            for timestring in timestrings:
+                parser.timestring_to_pendulum(timestring)
+    return run
+
+
+@benchmark('extract_connections')
+def extract_connections():
+    parsers = [ConnectionListParser.from_html(html, dt) for html, dt in search_pages()]
+
+    def run():
+        for parser in parsers:
+            parser._datetimes = {}
+            parser.connections
+    return run
+
+
+@benchmark('connection_list_from_list')
+def connection_list_from_list():
+    lists = [ConnectionListParser.from_html(html, dt).connections for html, dt in search_pages()]
+
+    def run():
+        for lst in lists:
+            ConnectionList.from_list(lst)
+    return run
+
+
+@benchmark('connection_details_from_list')
+def connection_details_from_list():
+    lists = [DetailParser.from_html(html).journeys() for html in detail_pages()]
+
+    def run():
+        for lst in lists:
+            ConnectionDetails.from_list(lst)
+    return run
+
+
+@benchmark('search_and_get_details')
+def search_and_get_details():
+    client = Client(session=ReplaySession('tests.test_functional.test_functional'))
+    dt = pendulum.create(2017, 12, 17, 14, 30, tz='Europe/Berlin')
+
+    def run():
+        connections = ConnectionList.search('Berlin Ostbahnhof', 'Bergisch Gladbach', dt, client=client)
+        connections[1].get_details()
+    return run
+
+
+def measure(setup, number, repeat):
+    func = setup()
+    func()
+    timings = [timing / number for timing in timeit.repeat(func, number=number, repeat=repeat)]
+    return OrderedDict([
+        ('min', min(timings)),
+        ('mean', statistics.mean(timings)),
+        ('stdev', statistics.stdev(timings) if len(timings) > 1 else 0.0),
+        ('number', number),
+        ('repeat', repeat),
+    ])
+
+
+def run(names=None, number=10, repeat=5):
+    results = OrderedDict()
+    for name, setup in BENCHMARKS.items():
+        if names and name not in names:
+            continue
+        results[name] = measure(setup, number, repeat)
+    return OrderedDict([
+        ('meta', OrderedDict([
+            ('version', __version__),
+            ('python', platform.python_version()),
+            ('platform', platform.platform()),
+            ('created', time.strftime('%Y-%m-%dT%H:%M:%S')),
+        ])),
+        ('results', results),
+    ])
+
+
+def compare(report, baseline, tolerance):
+    regressions = []
+    for name, result in report['results'].items():
+        if name not in baseline['results']:
+            continue
+        ratio = result['min'] / baseline['results'][name]['min']
+        print('{:<32} {:>6.2f}x {}'.format(name, ratio, 'REGRESSION' if ratio > tolerance else ''))
+        if ratio > tolerance:
+            regressions.append(name)
+    return regressions
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('names', nargs='*', help='only run these benchmarks')
+    parser.add_argument('--number', type=int, default=10)
+    parser.add_argument('--repeat', type=int, default=5)
+    parser.add_argument('--output', help='save results as JSON')
+    parser.add_argument('--compare', help='JSON results to compare against')
+    parser.add_argument('--tolerance', type=float, default=1.2)
+    args = parser.parse_args(argv)
+
+    report = run(args.names, args.number, args.repeat)
+    for name, result in report['results'].items():
+        print('{:<32} {:>10.3f} ms  (+/- {:.3f})'.format(name, result['min'] * 1000, result['stdev'] * 1000))
+    if args.output:
+        with open(args.output, 'w') as f:
+            json.dump(report, f, indent=2)
+    if args.compare:
+        with open(args.compare) as f:
+            baseline = json.load(f)
+        if compare(report, baseline, args.tolerance):
+            return 1
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
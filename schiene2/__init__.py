@@ -6,4 +6,7 @@ __author__ = """Lars Rinn"""
 __email__ = 'lm.rinn@outlook.com'
 __version__ = '0.1.0'
 
+from schiene2.client import AsyncClient, Client
 from schiene2.models import ConnectionList, Station
+from schiene2.monitor import DelayMonitor
+from schiene2.timetable import Timetable
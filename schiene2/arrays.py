@@ -0,0 +1,107 @@
+from schiene2.instrumentation import span
+
+
+class ConnectionArrays:
+    # one contiguous numpy array per column, times are epoch seconds and stations are codes into the stations
+    # list, products a bit mask over the products list
+
+    def __init__(self, columns, stations, products):
+        self.columns = columns
+        self.stations = stations
+        self.products = products
+
+    def __getattr__(self, name):
+        try:
+            return self.__dict__['columns'][name]
+        except KeyError:
+            raise AttributeError(name)
+
+    def __len__(self):
+        return len(self.columns['departure'])
+
+    @classmethod
+    def from_connections(cls, connections):
+        import numpy
+
+        stations = {}
+        products = {}
+        count = len(connections)
+
+        def station_code(station):
+            return stations.setdefault(station.name, len(stations))
+
+        def product_mask(connection):
+            mask = 0
+            for product in connection.products:
+                mask |= 1 << products.setdefault(product, len(products))
+            return mask
+
+        def column(values, dtype):
+            return numpy.fromiter(values, dtype=dtype, count=count)
+
+        with span('build.connection_arrays', rows=count):
+            columns = {
+                'departure': column((_.origin.time.int_timestamp for _ in connections), numpy.int64),
+                'arrival': column((_.destination.time.int_timestamp for _ in connections), numpy.int64),
+                'actual_departure': column((_.origin.actual_time.int_timestamp for _ in connections), numpy.int64),
+                'actual_arrival': column((_.destination.actual_time.int_timestamp for _ in connections), numpy.int64),
+                'transfers': column((_.transfers for _ in connections), numpy.int16),
+                'origin': column((station_code(_.origin.station) for _ in connections), numpy.int32),
+                'destination': column((station_code(_.destination.station) for _ in connections), numpy.int32),
+                'product_mask': column((product_mask(_) for _ in connections), numpy.uint64),
+            }
+        return cls(columns, list(stations), list(products))
+
+    @property
+    def departure_delay(self):
+        return (self.actual_departure - self.departure) / 60
+
+    @property
+    def arrival_delay(self):
+        return (self.actual_arrival - self.arrival) / 60
+
+    @property
+    def duration(self):
+        return (self.arrival - self.departure) / 60
+
+    def uses_product(self, product):
+        import numpy
+
+        if product not in self.products:
+            return numpy.zeros(len(self), dtype=bool)
+        return (self.product_mask & (1 << self.products.index(product))) != 0
+
+    def delay_stats(self, threshold=5, percentiles=(50, 90, 99)):
+        # arrival delays in minutes, threshold counts connections arriving at least that late
+        import numpy
+
+        delays = self.arrival_delay
+        if not len(delays):
+            return {'count': 0}
+        stats = {
+            'count': len(delays),
+            'mean': float(delays.mean()),
+            'max': float(delays.max()),
+            'delayed': int(numpy.count_nonzero(delays >= threshold)),
+            'delayed_share': float(numpy.count_nonzero(delays >= threshold) / len(delays)),
+        }
+        for percentile, value in zip(percentiles, numpy.percentile(delays, percentiles)):
+            stats['p{}'.format(percentile)] = float(value)
+        return stats
+
+    def to_dataframe(self):
+        import pandas
+
+        frame = pandas.DataFrame({
+            'departure': pandas.to_datetime(self.departure, unit='s', utc=True),
+            'arrival': pandas.to_datetime(self.arrival, unit='s', utc=True),
+            'departure_delay': self.departure_delay,
+            'arrival_delay': self.arrival_delay,
+            'duration': self.duration,
+            'transfers': self.transfers,
+            'origin': pandas.Categorical.from_codes(self.origin, self.stations),
+            'destination': pandas.Categorical.from_codes(self.destination, self.stations),
+        })
+        for product in self.products:
+            frame['product_{}'.format(product)] = self.uses_product(product)
+        return frame
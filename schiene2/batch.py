@@ -0,0 +1,54 @@
+from collections import namedtuple
+from concurrent.futures import ThreadPoolExecutor
+import time
+
+ItemResult = namedtuple('ItemResult', ['result', 'error', 'elapsed'])
+
+
+class BatchResult:
+    def __init__(self, items, results, errors, timings, elapsed):
+        self.items = items
+        self.results = results
+        self.errors = errors
+        self.timings = timings
+        self.elapsed = elapsed
+
+    def __getitem__(self, item):
+        return self.results[item]
+
+    def __len__(self):
+        return len(self.results)
+
+    def __iter__(self):
+        return iter(self.results)
+
+    @property
+    def ok(self):
+        return not self.errors
+
+    def by_item(self):
+        return {
+            item: ItemResult(self.results[index], self.errors.get(index), self.timings[index])
+            for index, item in enumerate(self.items)
+        }
+
+
+def run_batch(func, items, max_workers=None):
+    items = list(items)
+    results = [None] * len(items)
+    timings = [None] * len(items)
+    errors = {}
+
+    def call(index):
+        started = time.perf_counter()
+        try:
+            results[index] = func(items[index])
+        except Exception as e:
+            errors[index] = e
+        timings[index] = time.perf_counter() - started
+
+    started = time.perf_counter()
+    if items:
+        with ThreadPoolExecutor(max_workers=max_workers or len(items)) as executor:
+            list(executor.map(call, range(len(items))))
+    return BatchResult(items, results, errors, timings, time.perf_counter() - started)
@@ -0,0 +1,153 @@
+from collections import OrderedDict
+from datetime import datetime
+from urllib.parse import urlencode
+import pendulum
+import sqlite3
+import threading
+import time
+
+CACHED_PARAMS = ('S', 'Z', 'date', 'time', 'REQ0JourneyProduct_opt0')
+
+
+def cache_key(url, params=None):
+    if not params:
+        return url
+    normalized = sorted(
+        (name, str(value).strip()) for name, value in params.items() if name in CACHED_PARAMS
+    )
+    return '{}{}'.format(url, urlencode(normalized))
+
+
+def is_realtime_request(params, window):
+    # detail pages carry no query time, so they are always treated as realtime
+    if not params:
+        return True
+    dt = datetime.strptime('{} {}'.format(params['date'], params['time']), '%d.%m.%y %H:%M')
+    dt = pendulum.instance(dt, tz='Europe/Berlin')
+    return abs((dt - pendulum.now('Europe/Berlin')).total_seconds()) < window
+
+
+class BaseCache:
+    def __init__(self, maxsize, ttl=3600, realtime_ttl=60, realtime_window=3 * 3600):
+        self.maxsize = maxsize
+        self.ttl = ttl
+        self.realtime_ttl = realtime_ttl
+        self.realtime_window = realtime_window
+        self.hits = 0
+        self.misses = 0
+
+    def get(self, key):
+        value = self.load(key, time.time())
+        if value is None:
+            self.misses += 1
+        else:
+            self.hits += 1
+        return value
+
+    def set(self, key, value, realtime=False):
+        ttl = self.realtime_ttl if realtime else self.ttl
+        self.store(key, value, time.time() + ttl)
+
+    def load(self, key, now):
+        raise NotImplementedError
+
+    def store(self, key, value, expires):
+        raise NotImplementedError
+
+    def clear(self):
+        raise NotImplementedError
+
+    def __len__(self):
+        raise NotImplementedError
+
+    @property
+    def stats(self):
+        return {
+            'hits': self.hits,
+            'misses': self.misses,
+            'size': len(self),
+        }
+
+
+class MemoryCache(BaseCache):
+    def __init__(self, maxsize=256, **kwargs):
+        super(MemoryCache, self).__init__(maxsize, **kwargs)
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+
+    def load(self, key, now):
+        with self._lock:
+            try:
+                value, expires = self._entries[key]
+            except KeyError:
+                return None
+            if expires <= now:
+                del self._entries[key]
+                return None
+            self._entries.move_to_end(key)
+            return value
+
+    def store(self, key, value, expires):
+        with self._lock:
+            self._entries[key] = (value, expires)
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.maxsize:
+                self._entries.popitem(last=False)
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+
+    def __len__(self):
+        return len(self._entries)
+
+
+class SQLiteCache(BaseCache):
+    def __init__(self, path, maxsize=4096, **kwargs):
+        super(SQLiteCache, self).__init__(maxsize, **kwargs)
+        self.path = path
+        self._local = threading.local()
+        with self.connection:
+            self.connection.execute(
+                'CREATE TABLE IF NOT EXISTS responses '
+                '(key TEXT PRIMARY KEY, value TEXT, expires REAL, accessed REAL)'
+            )
+
+    @property
+    def connection(self):
+        # sqlite3 connections must not be shared between threads
+        connection = getattr(self._local, 'connection', None)
+        if connection is None:
+            connection = sqlite3.connect(self.path, timeout=30)
+            self._local.connection = connection
+        return connection
+
+    def load(self, key, now):
+        with self.connection as connection:
+            row = connection.execute('SELECT value, expires FROM responses WHERE key = ?', (key,)).fetchone()
+            if row is None:
+                return None
+            if row[1] <= now:
+                connection.execute('DELETE FROM responses WHERE key = ?', (key,))
+                return None
+            connection.execute('UPDATE responses SET accessed = ? WHERE key = ?', (time.time(), key))
+            return row[0]
+
+    def store(self, key, value, expires):
+        with self.connection as connection:
+            connection.execute(
+                'INSERT OR REPLACE INTO responses (key, value, expires, accessed) VALUES (?, ?, ?, ?)',
+                (key, value, expires, time.time())
+            )
+            connection.execute(
+                'DELETE FROM responses WHERE key IN '
+                '(SELECT key FROM responses ORDER BY accessed DESC LIMIT -1 OFFSET ?)',
+                (self.maxsize,)
+            )
+
+    def clear(self):
+        with self.connection as connection:
+            connection.execute('DELETE FROM responses')
+
+    def __len__(self):
+        return self.connection.execute('SELECT COUNT(*) FROM responses').fetchone()[0]
@@ -0,0 +1,172 @@
+import codecs
+import requests
+from requests.adapters import HTTPAdapter
+
+from schiene2.cache import cache_key, is_realtime_request
+from schiene2.instrumentation import span
+from schiene2.singleflight import AsyncSingleFlight, SingleFlight, flight_key
+from schiene2.throttle import RequestScheduler, check_status
+
+
+class Client:
+    def __init__(self, session=None, pool_size=10, timeout=10, cache=None, scheduler=None, coalesce=True):
+        if session is None:
+            session = requests.Session()
+            adapter = HTTPAdapter(pool_connections=pool_size, pool_maxsize=pool_size)
+            session.mount('http://', adapter)
+            session.mount('https://', adapter)
+        self.session = session
+        self.timeout = timeout
+        self.cache = cache
+        self.scheduler = scheduler
+        self.single_flight = SingleFlight() if coalesce else None
+
+    def get(self, url, params=None):
+        if self.single_flight is None:
+            return self._cached_get(url, params)
+        return self.single_flight.do(flight_key(url, params), self._cached_get, url, params)
+
+    def _cached_get(self, url, params):
+        if self.cache is None:
+            return self.fetch(url, params)
+        key = cache_key(url, params)
+        html = self.cache.get(key)
+        if html is None:
+            html = self.fetch(url, params)
+            self.cache.set(key, html, is_realtime_request(params, self.cache.realtime_window))
+        return html
+
+    def fetch(self, url, params=None):
+        with span('http.get', url=url):
+            if self.scheduler is None:
+                return self._get(url, params)
+            return self.scheduler.call(self._get, url, params)
+
+    def _get(self, url, params):
+        rsp = self.session.get(url=url, params=params, timeout=self.timeout)
+        check_status(getattr(rsp, 'status_code', None), url)
+        return rsp.text
+
+    def stream(self, url, params=None, chunk_size=8192):
+        # yields the decoded body as it arrives, neither coalesced nor cached, but a cached page is used
+        if self.cache is not None:
+            html = self.cache.get(cache_key(url, params))
+            if html is not None:
+                yield html
+                return
+        with span('http.stream', url=url):
+            if self.scheduler is None:
+                rsp = self._open(url, params)
+            else:
+                rsp = self.scheduler.call(self._open, url, params)
+            try:
+                decoder = codecs.getincrementaldecoder(rsp.encoding or 'utf-8')(errors='replace')
+                for chunk in rsp.iter_content(chunk_size):
+                    text = decoder.decode(chunk)
+                    if text:
+                        yield text
+                text = decoder.decode(b'', final=True)
+                if text:
+                    yield text
+            finally:
+                rsp.close()
+
+    def _open(self, url, params):
+        rsp = self.session.get(url=url, params=params, timeout=self.timeout, stream=True)
+        check_status(getattr(rsp, 'status_code', None), url)
+        return rsp
+
+    def post(self, url, data=None):
+        with span('http.post', url=url):
+            if self.scheduler is None:
+                return self._post(url, data)
+            return self.scheduler.call(self._post, url, data)
+
+    def _post(self, url, data):
+        rsp = self.session.post(url, data, timeout=self.timeout)
+        check_status(getattr(rsp, 'status_code', None), url)
+        return rsp.text
+
+
+_default_client = None
+
+
+def get_default_client():
+    global _default_client
+    if _default_client is None:
+        _default_client = Client(scheduler=RequestScheduler())
+    return _default_client
+
+
+def set_default_client(client):
+    global _default_client
+    _default_client = client
+
+
+class AsyncClient:
+    def __init__(self, session=None, pool_size=10, timeout=10, cache=None, scheduler=None, coalesce=True):
+        self._session = session
+        self._owns_session = session is None
+        self.pool_size = pool_size
+        self.timeout = timeout
+        self.cache = cache
+        self.scheduler = scheduler
+        self.single_flight = AsyncSingleFlight() if coalesce else None
+
+    async def __aenter__(self):
+        return self
+
+    async def __aexit__(self, exc_type, exc_val, exc_tb):
+        await self.close()
+
+    @property
+    def session(self):
+        if self._session is None:
+            import aiohttp
+            self._session = aiohttp.ClientSession(
+                connector=aiohttp.TCPConnector(limit=self.pool_size),
+                timeout=aiohttp.ClientTimeout(total=self.timeout)
+            )
+        return self._session
+
+    async def get(self, url, params=None):
+        if self.single_flight is None:
+            return await self._cached_get(url, params)
+        return await self.single_flight.do(flight_key(url, params), self._cached_get, url, params)
+
+    async def _cached_get(self, url, params):
+        if self.cache is None:
+            return await self.fetch(url, params)
+        key = cache_key(url, params)
+        html = self.cache.get(key)
+        if html is None:
+            html = await self.fetch(url, params)
+            self.cache.set(key, html, is_realtime_request(params, self.cache.realtime_window))
+        return html
+
+    async def fetch(self, url, params=None):
+        with span('http.get', url=url):
+            if self.scheduler is None:
+                return await self._get(url, params)
+            return await self.scheduler.acall(self._get, url, params)
+
+    async def _get(self, url, params):
+        async with self.session.get(url, params=params) as rsp:
+            check_status(getattr(rsp, 'status', None), url)
+            return await rsp.text()
+
+    async def post(self, url, data=None):
+        with span('http.post', url=url):
+            if self.scheduler is None:
+                return await self._post(url, data)
+            return await self.scheduler.acall(self._post, url, data)
+
+    async def _post(self, url, data):
+        async with self.session.post(url, data=data) as rsp:
+            check_status(getattr(rsp, 'status', None), url)
+            return await rsp.text()
+
+    async def close(self):
+        if self._owns_session and self._session is not None:
+            await self._session.close()
+            self._session = None
@@ -0,0 +1,109 @@
+from collections import OrderedDict
+import bisect
+import threading
+import time
+
+_hooks = []
+
+
+def add_hook(hook):
+    _hooks.append(hook)
+
+
+def remove_hook(hook):
+    _hooks.remove(hook)
+
+
+class NullSpan:
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_val, exc_tb):
+        return False
+
+
+NULL_SPAN = NullSpan()
+
+
+class Span:
+    def __init__(self, name, tags):
+        self.name = name
+        self.tags = tags
+        self.start = None
+        self.duration = None
+        self.error = None
+
+    def __enter__(self):
+        self.start = time.perf_counter()
+        return self
+
+    def __exit__(self, exc_type, exc_val, exc_tb):
+        self.duration = time.perf_counter() - self.start
+        self.error = exc_val
+        for hook in list(_hooks):
+            hook(self)
+        return False
+
+
+def span(name, **tags):
+    # without registered hooks a shared no-op context manager is returned, so nothing is timed
+    if not _hooks:
+        return NULL_SPAN
+    return Span(name, tags)
+
+
+class HistogramHook:
+    # upper bounds in seconds, the last bucket collects everything slower
+    BUCKETS = (0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10)
+
+    def __init__(self, buckets=BUCKETS):
+        self.buckets = tuple(buckets)
+        self.histograms = OrderedDict()
+        self._lock = threading.Lock()
+
+    def __call__(self, span):
+        with self._lock:
+            histogram = self.histograms.get(span.name)
+            if histogram is None:
+                histogram = self.histograms[span.name] = {
+                    'count': 0,
+                    'errors': 0,
+                    'sum': 0.0,
+                    'min': None,
+                    'max': None,
+                    'buckets': [0] * (len(self.buckets) + 1),
+                }
+            histogram['count'] += 1
+            histogram['errors'] += span.error is not None
+            histogram['sum'] += span.duration
+            histogram['min'] = span.duration if histogram['min'] is None else min(histogram['min'], span.duration)
+            histogram['max'] = span.duration if histogram['max'] is None else max(histogram['max'], span.duration)
+            histogram['buckets'][bisect.bisect_left(self.buckets, span.duration)] += 1
+
+    def percentile(self, name, percentile):
+        # upper bound of the bucket holding the percentile, the maximum for the overflow bucket
+        histogram = self.histograms[name]
+        rank = histogram['count'] * percentile / 100
+        seen = 0
+        for index, count in enumerate(histogram['buckets']):
+            seen += count
+            if count and seen >= rank:
+                return min(self.buckets[index], histogram['max']) if index < len(self.buckets) else histogram['max']
+        return histogram['max']
+
+    def summary(self):
+        return OrderedDict(
+            (name, {
+                'count': histogram['count'],
+                'errors': histogram['errors'],
+                'mean': histogram['sum'] / histogram['count'],
+                'max': histogram['max'],
+                'p50': self.percentile(name, 50),
+                'p99': self.percentile(name, 99),
+            })
+            for name, histogram in self.histograms.items()
+        )
+
+    def reset(self):
+        with self._lock:
+            self.histograms.clear()
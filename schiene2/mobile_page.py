@@ -1,17 +1,132 @@
-from bs4 import BeautifulSoup
+from bs4 import BeautifulSoup, SoupStrainer
+from bs4.builder import builder_registry
+from html.parser import HTMLParser
+import asyncio
 import pendulum
-import requests
 import re
 
+from schiene2.client import AsyncClient, get_default_client
+from schiene2.instrumentation import span
+
+SEARCH_URL = 'http://mobile.bahn.de/bin/mobil/query.exe/dox?'
+AMBIGUOUS_ENTRY_MARKER = 'Ihre Eingabe ist nicht eindeutig'
+TIMEZONE = pendulum.timezone('Europe/Berlin')
+
+_parser_backend = 'html.parser'
+
+
+def set_parser_backend(features):
+    if builder_registry.lookup(features) is None:
+        raise ValueError('BeautifulSoup tree builder {!r} is not available'.format(features))
+    global _parser_backend
+    _parser_backend = features
+
+
+def class_strainer(*classes):
+    classes = set(classes)
+
+    def match(value):
+        if value is None:
+            return False
+        if isinstance(value, str):
+            value = value.split()
+        return not classes.isdisjoint(value)
+    return SoupStrainer(class_=match)
+
+
+CONNECTION_LIST_STRAINER = class_strainer('editBtnCon', 'ovTable', 'bline')
+DETAIL_STRAINER = class_strainer('motSection', 'routeStart', 'routeChange', 'routeEnd', 'querysummary2')
+STOP_CLASSES = frozenset(['routeStart', 'routeChange', 'routeEnd', 'querysummary2'])
+STOPS_STRAINER = class_strainer(*STOP_CLASSES)
+AMBIGUOUS_ENTRY_STRAINER = SoupStrainer(['form', 'input', 'select'])
+
+
+def make_soup(html, strainer=None):
+    return BeautifulSoup(html, _parser_backend, parse_only=strainer)
+
+
+class FragmentParser(HTMLParser):
+    # collects the markup of matching elements while a page is fed in chunks, every element is handed out as its
+    # own soup once its end tag has been read
+    def __init__(self, match):
+        super(FragmentParser, self).__init__(convert_charrefs=False)
+        self.match = match
+        self._fragments = []
+        self._parts = None
+        self._tag = None
+        self._depth = 0
+
+    def handle_starttag(self, tag, attrs):
+        if self._parts is None:
+            classes = (dict(attrs).get('class') or '').split()
+            if not self.match(tag, classes):
+                return
+            self._parts = []
+            self._tag = tag
+        if tag == self._tag:
+            self._depth += 1
+        self._parts.append(self.get_starttag_text())
+
+    def handle_startendtag(self, tag, attrs):
+        if self._parts is not None:
+            self._parts.append(self.get_starttag_text())
+
+    def handle_endtag(self, tag):
+        if self._parts is None:
+            return
+        self._parts.append('</{}>'.format(tag))
+        if tag == self._tag:
+            self._depth -= 1
+            if not self._depth:
+                self._fragments.append(''.join(self._parts))
+                self._parts = None
+
+    def handle_data(self, data):
+        if self._parts is not None:
+            self._parts.append(data)
+
+    def handle_entityref(self, name):
+        self.handle_data('&{};'.format(name))
+
+    def handle_charref(self, name):
+        self.handle_data('&#{};'.format(name))
+
+    def pop(self):
+        fragments, self._fragments = self._fragments, []
+        return [make_soup(fragment) for fragment in fragments]
+
+
+async def run_in_executor(func, *args):
+    loop = asyncio.get_event_loop()
+    return await loop.run_in_executor(None, func, *args)
+
 
 class BaseParser:
     def timestring_to_pendulum(self, timestring):
-        datetimestring = "{} {}".format(self.datestring, timestring)
-        datetime = pendulum.parse(datetimestring, year_first=False, day_first=True, tz='Europe/Berlin')
+        # results only depend on the page's date and first time, so they are memoized per parser
+        datetimes = self.__dict__.setdefault('_datetimes', {})
+        try:
+            return datetimes[timestring]
+        except KeyError:
+            pass
+        year, month, day = self.date
+        datetime = pendulum.datetime(year, month, day, int(timestring[:2]), int(timestring[3:5]), tz=TIMEZONE)
         if timestring < self.first_timestring:
             datetime = datetime.add(days=1)
+        datetimes[timestring] = datetime
         return datetime
 
+    @property
+    def date(self):
+        datestring = self.datestring
+        cached = self.__dict__.get('_date')
+        if cached is None or cached[0] != datestring:
+            day, month, year = (int(part) for part in re.split(r'\D', datestring))
+            if year < 100:
+                year += 2000
+            cached = self._date = (datestring, (year, month, day))
+        return cached[1]
+
     @property
     def datestring(self):
         raise NotImplementedError
@@ -21,10 +136,12 @@ class ConnectionRowParser:
     def __init__(self, row):
         self.row = row
         self.columns = row.find_all('td')
+        self.time_link = self.columns[0].a
+        self._actual_times = None
 
     @property
     def detail_url(self):
-        return self.columns[0].a.get('href')
+        return self.time_link.get('href')
 
     @property
     def transfers(self):
@@ -37,14 +154,19 @@ class ConnectionRowParser:
 
     @property
     def origin_time(self):
-        return self.columns[0].a.contents[0].string
+        return self.time_link.contents[0].string
 
     @property
     def destination_time(self):
-        return self.columns[0].a.contents[2].string
+        return self.time_link.contents[2].string
 
     @property
     def actual_times(self):
+        if self._actual_times is None:
+            self._actual_times = self._parse_actual_times()
+        return self._actual_times
+
+    def _parse_actual_times(self):
         delay_column = self.columns[1]
         children = delay_column.find_all(['span', 'br'])
         origin_delayed = children[0].text != ''
@@ -69,8 +191,55 @@ class ConnectionRowParser:
 
 
 class ConnectionListParser(BaseParser):
-    def __init__(self, origin, destination, dt=pendulum.now(), only_direct=False):
-        params = {
+    def __init__(self, origin, destination, dt=None, only_direct=False, client=None):
+        dt = dt or pendulum.now()
+        client = client or get_default_client()
+        params = self.request_params(origin, destination, dt, only_direct)
+        html = client.get(url=SEARCH_URL, params=params)
+        if AMBIGUOUS_ENTRY_MARKER in html:
+            html = self.handle_ambiguous_entry(html, client)
+        self.parse(html, dt)
+
+    def parse(self, html, dt):
+        with span('parse.connection_list'):
+            self.soup = make_soup(html, CONNECTION_LIST_STRAINER)
+        self.first_timestring = dt.strftime('%H:%M')
+        self._header_fields = None
+        self._connection_rows = None
+        self._datetimes = {}
+
+    @classmethod
+    def from_html(cls, html, dt):
+        parser = cls.__new__(cls)
+        parser.parse(html, dt)
+        return parser
+
+    @classmethod
+    def iter_pages(cls, origin, destination, dt=None, only_direct=False, client=None):
+        dt = dt or pendulum.now()
+        client = client or get_default_client()
+        parser = cls(origin, destination, dt, only_direct, client)
+        yield parser
+        while parser.later_url is not None:
+            parser = cls.from_html(client.get(parser.later_url), dt)
+            yield parser
+
+    @classmethod
+    async def fetch_async(cls, origin, destination, dt=None, only_direct=False, client=None):
+        dt = dt or pendulum.now()
+        if client is None:
+            async with AsyncClient() as client:
+                return await cls.fetch_async(origin, destination, dt, only_direct, client)
+        params = cls.request_params(origin, destination, dt, only_direct)
+        html = await client.get(url=SEARCH_URL, params=params)
+        if AMBIGUOUS_ENTRY_MARKER in html:
+            url, field_values = await run_in_executor(cls.ambiguous_entry_form, html)
+            html = await client.post(url, field_values)
+        return html
+
+    @staticmethod
+    def request_params(origin, destination, dt, only_direct=False):
+        return {
             'S': str(origin),
             'Z': str(destination),
             'date': dt.strftime("%d.%m.%y"),
@@ -78,53 +247,98 @@ class ConnectionListParser(BaseParser):
             'start': 1,
             'REQ0JourneyProduct_opt0': 1 if only_direct else 0
         }
-        rsp = requests.get(url='http://mobile.bahn.de/bin/mobil/query.exe/dox?', params=params)
-        html = rsp.text
-        if 'Ihre Eingabe ist nicht eindeutig' in html:
-            html = self.handle_ambiguous_entry(html)
-        self.soup = BeautifulSoup(html, 'html.parser')
-        self.first_timestring = dt.strftime('%H:%M')
+
+    @classmethod
+    def stream(cls, origin, destination, dt=None, only_direct=False, client=None):
+        dt = dt or pendulum.now()
+        client = client or get_default_client()
+        params = cls.request_params(origin, destination, dt, only_direct)
+        parser = cls.from_html('', dt)
+        for connection in parser.iter_connections(client.stream(SEARCH_URL, params), client):
+            yield connection
+
+    def iter_connections(self, chunks, client=None):
+        # yields every connection as soon as its row has been read, rows are not kept
+        fragments = FragmentParser(lambda tag, classes: tag == 'tr' or 'editBtnCon' in classes)
+        # the page is only kept until the header shows it is not an ambiguity form
+        head = []
+        for chunk in chunks:
+            if head is not None:
+                head.append(chunk)
+            fragments.feed(chunk)
+            for soup in fragments.pop():
+                if head is not None:
+                    # ambiguity forms have an editBtnCon section as well, but without the date
+                    if soup.find('div', class_='editBtnCon') is not None and soup.find('span', class_='grey'):
+                        self.soup = soup
+                        self._header_fields = None
+                        head = None
+                    continue
+                if soup.find('td', class_='overview timelink') is not None:
+                    yield self.connection(soup.find('tr'))
+        fragments.close()
+        if head is not None:
+            html = ''.join(head)
+            if AMBIGUOUS_ENTRY_MARKER in html:
+                html = self.handle_ambiguous_entry(html, client)
+                for connection in self.iter_connections([html]):
+                    yield connection
 
     @property
     def connections(self):
-        connections = []
-        for connection_row in self.connection_rows:
-            row_parser = ConnectionRowParser(connection_row)
-            data = {
-                'detail_url': row_parser.detail_url,
-                'transfers': row_parser.transfers,
-                'products': row_parser.products,
-                'origin': {
-                    'station': self.origin_station,
-                    'time': self.timestring_to_pendulum(
-                        row_parser.origin_time
-                    ),
-                    'actual_time': self.timestring_to_pendulum(
-                        row_parser.actual_origin_time
-                    )
-                },
-                'destination': {
-                    'station': self.destination_station,
-                    'time': self.timestring_to_pendulum(
-                        row_parser.destination_time
-                    ),
-                    'actual_time': self.timestring_to_pendulum(
-                        row_parser.actual_destination_time
-                    )
-                }
-            }
-            connections.append(data)
-        return connections
+        with span('extract.connections'):
+            return [self.connection(connection_row) for connection_row in self.connection_rows]
+
+    def connection(self, connection_row):
+        row_parser = ConnectionRowParser(connection_row)
+        return {
+            'detail_url': row_parser.detail_url,
+            'transfers': row_parser.transfers,
+            'products': row_parser.products,
+            'origin': self.origin(row_parser),
+            'destination': self.destination(row_parser)
+        }
+
+    def origin(self, row_parser):
+        return {
+            'station': self.origin_station,
+            'time': self.timestring_to_pendulum(
+                row_parser.origin_time
+            ),
+            'actual_time': self.timestring_to_pendulum(
+                row_parser.actual_origin_time
+            )
+        }
+
+    def destination(self, row_parser):
+        return {
+            'station': self.destination_station,
+            'time': self.timestring_to_pendulum(
+                row_parser.destination_time
+            ),
+            'actual_time': self.timestring_to_pendulum(
+                row_parser.actual_destination_time
+            )
+        }
 
     @property
     def connection_rows(self):
-        return [first_column.parent
-                for first_column
-                in self.soup.find_all("td", class_="overview timelink")]
+        if self._connection_rows is None:
+            self._connection_rows = [first_column.parent
+                                     for first_column
+                                     in self.soup.find_all("td", class_="overview timelink")]
+        return self._connection_rows
+
+    @classmethod
+    def handle_ambiguous_entry(cls, html, client=None):
+        client = client or get_default_client()
+        url, field_values = cls.ambiguous_entry_form(html)
+        return client.post(url, field_values)
 
     @staticmethod
-    def handle_ambiguous_entry(html):
-        soup = BeautifulSoup(html, 'html.parser')
+    def ambiguous_entry_form(html):
+        with span('parse.ambiguous_entry'):
+            soup = make_soup(html, AMBIGUOUS_ENTRY_STRAINER)
 
         skip = [
             'chgBC=y&getstop',
@@ -142,51 +356,106 @@ class ConnectionListParser(BaseParser):
             first_option = field.find('option')
             field_values[name] = first_option.get('value')
         url = soup.find('form').get('action')
-
-        response = requests.post(url, field_values)
-        return response.text
+        return url, field_values
 
     @property
     def header(self):
         return self.soup.find('div', class_='editBtnCon')
 
+    @property
+    def later_url(self):
+        for link in self.soup.select('div.bline a'):
+            if 'Später' in link.text:
+                return link.get('href')
+        return None
+
+    @property
+    def header_fields(self):
+        if self._header_fields is None:
+            spans = self.header.find_all('span')
+            span_with_datestring = [span for span in spans if 'grey' in span.get('class', [])][0]
+            datestring = re.search(r'\d\d.\d\d.\d\d\d\d', str(span_with_datestring)).group(0)
+            self._header_fields = (spans[0].string, spans[1].string, datestring)
+        return self._header_fields
+
     @property
     def datestring(self):
-        div_with_datestring = self.header.find('span', class_='grey')
-        return re.search(r'\d\d.\d\d.\d\d\d\d', str(div_with_datestring)).group(0)
+        return self.header_fields[2]
 
     @property
     def origin_station(self):
-        return self.header.find_all('span')[0].string
+        return self.header_fields[0]
 
     @property
     def destination_station(self):
-        return self.header.find_all('span')[1].string
+        return self.header_fields[1]
 
 
 class DetailParser(BaseParser):
-    def __init__(self, url):
+    def __init__(self, url, client=None):
+        client = client or get_default_client()
+        self.parse(client.get(url))
+
+    def parse(self, html, strainer=DETAIL_STRAINER):
         self.station_names = []
         self.times = []
         self.tracks = []
-        rsp = requests.get(url)
-        self.soup = BeautifulSoup(rsp.text, 'html.parser')
+        with span('parse.detail'):
+            self.soup = make_soup(html, strainer)
+        self._summary_fields = None
+        self._datetimes = {}
+
+    @classmethod
+    def from_html(cls, html, strainer=DETAIL_STRAINER):
+        parser = cls.__new__(cls)
+        parser.parse(html, strainer)
+        return parser
+
+    @staticmethod
+    async def fetch_async(url, client=None):
+        if client is None:
+            async with AsyncClient() as client:
+                return await client.get(url)
+        return await client.get(url)
+
+    @classmethod
+    def stream(cls, url, client=None):
+        client = client or get_default_client()
+        parser = cls.from_html('')
+        for stop in parser.iter_stops(client.stream(url)):
+            yield stop
+
+    def iter_stops(self, chunks):
+        # yields every departure or arrival as soon as its section has been read
+        fragments = FragmentParser(lambda tag, classes: not STOP_CLASSES.isdisjoint(classes))
+        for chunk in chunks:
+            fragments.feed(chunk)
+            for soup in fragments.pop():
+                if soup.find('span', class_='querysummary2') is not None:
+                    self.soup = soup
+                    self._summary_fields = None
+                    continue
+                div = soup.find('div')
+                if div is not None and div.text != '\n':
+                    yield self.convert_raw_departure_or_arrival(div)
+        fragments.close()
 
     def journeys(self):
-        # todo delays
-        departure_or_arrivals = [
-            self.convert_raw_departure_or_arrival(_) for _ in self._raw_departure_or_arrivals
-        ]
-        departures = departure_or_arrivals[::2]
-        arrivals = departure_or_arrivals[1::2]
-        journeys = []
-        for departure, arrival, train in zip(departures, arrivals, self.trains):
-            journeys.append({
-                'departure': departure,
-                'arrival': arrival,
-                'train': train
-            })
-        return journeys
+        with span('extract.journeys'):
+            departure_or_arrivals = self.departure_or_arrivals()
+            departures = departure_or_arrivals[::2]
+            arrivals = departure_or_arrivals[1::2]
+            journeys = []
+            for departure, arrival, train in zip(departures, arrivals, self.trains):
+                journeys.append({
+                    'departure': departure,
+                    'arrival': arrival,
+                    'train': train
+                })
+            return journeys
+
+    def departure_or_arrivals(self):
+        return [self.convert_raw_departure_or_arrival(_) for _ in self._raw_departure_or_arrivals]
 
     @property
     def trains(self):
@@ -202,15 +471,23 @@ class DetailParser(BaseParser):
         raw = self.soup.find_all('div', class_=['routeStart', 'routeChange', 'routeEnd'])
         return [_ for _ in raw if _.text != '\n']
 
+    @property
+    def summary_fields(self):
+        if self._summary_fields is None:
+            div_with_datestring = str(self.soup.find('span', class_='querysummary2'))
+            self._summary_fields = (
+                re.search(r'\d\d.\d\d.\d\d', div_with_datestring).group(0),
+                re.search(r'\d\d:\d\d', div_with_datestring).group(0)
+            )
+        return self._summary_fields
+
     @property
     def datestring(self):
-        div_with_datestring = self.soup.find('span', class_='querysummary2')
-        return re.search(r'\d\d.\d\d.\d\d', str(div_with_datestring)).group(0)
+        return self.summary_fields[0]
 
     @property
     def first_timestring(self):
-        div_with_datestring = self.soup.find('span', class_='querysummary2')
-        return re.search(r'\d\d:\d\d', str(div_with_datestring)).group(0)
+        return self.summary_fields[1]
 
     def convert_raw_departure_or_arrival(self, div):
         # todo in own class
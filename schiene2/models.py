@@ -1,21 +1,64 @@
+import heapq
 import pendulum
 from pendulum import Pendulum
 import re
-from schiene2.mobile_page import DetailParser, ConnectionListParser
+import weakref
+from collections import OrderedDict, namedtuple
+from schiene2.arrays import ConnectionArrays
+from schiene2.batch import run_batch
+from schiene2.client import get_default_client
+from schiene2.instrumentation import span
+from schiene2.mobile_page import DetailParser, ConnectionListParser, ConnectionRowParser, STOPS_STRAINER, \
+    run_in_executor
+from schiene2.throttle import RateLimiter
+
+DelayChange = namedtuple('DelayChange', ['stop', 'previous', 'current'])
+Rebooking = namedtuple('Rebooking', ['station', 'connection', 'details'])
+
+
+def fetch_actual_times(detail_url, client=None):
+    # only the stop sections are parsed, keyed by station name and scheduled time
+    client = client or get_default_client()
+    with span('refresh_delays', url=detail_url):
+        parser = DetailParser.from_html(client.get(detail_url), STOPS_STRAINER)
+        return {
+            (str(stop['station']), stop['time']): stop['actual_time']
+            for stop in parser.departure_or_arrivals()
+        }
 
 
 class Station:
-    def __init__(self, name):
-        self.name = name
+    __slots__ = ('name', '__weakref__')
+    # stations are interned by name, so repeated stations share one instance
+    _instances = weakref.WeakValueDictionary()
+
+    def __new__(cls, name):
+        name = str(name)
+        station = cls._instances.get(name)
+        if station is None:
+            station = super(Station, cls).__new__(cls)
+            station.name = name
+            station = cls._instances.setdefault(name, station)
+        return station
+
+    def __getnewargs__(self):
+        return (self.name,)
 
     def __str__(self):
         return self.name
 
     def __eq__(self, other):
+        if not isinstance(other, Station):
+            return NotImplemented
         return self.name == other.name
 
+    def __hash__(self):
+        return hash(self.name)
+
 
 class BaseConnection:
+    __slots__ = ()
+
     def __str__(self):
         return '{}: {}\n' \
                '  Umstiege: {}\n' \
@@ -34,7 +77,7 @@ class BaseConnection:
     def __repr__(self):
         return self.__str__()
 
-    def get_details(self):
+    def get_details(self, client=None):
         raise NotImplementedError
 
     @property
@@ -43,6 +86,8 @@ class BaseConnection:
 
 
 class ConnectionDetails(BaseConnection):
+    __slots__ = ('journeys', '_original_journeys', 'products')
+
     def __init__(self, journeys):
         self.journeys = journeys
         self._original_journeys = None
@@ -58,13 +103,36 @@ class ConnectionDetails(BaseConnection):
             self._original_journeys = value
 
     @classmethod
-    def from_list(cls, lst):
-        journeys = [
-            Journey.from_dict(_) for _ in lst
-        ]
-        return ConnectionDetails(journeys)
+    def from_list(cls, lst, detail_url=None):
+        with span('build.connection_details'):
+            journeys = [
+                Journey.from_dict(_, detail_url) for _ in lst
+            ]
+            return ConnectionDetails(journeys)
 
-    def search_after_missed_at_station(self, station: Station):
+    @property
+    def detail_urls(self):
+        return list(OrderedDict.fromkeys(journey.detail_url for journey in self.journeys if journey.detail_url))
+
+    def refresh_delays(self, client=None):
+        changes = []
+        for detail_url in self.detail_urls:
+            changes += self.apply_actual_times(detail_url, fetch_actual_times(detail_url, client))
+        return changes
+
+    def apply_actual_times(self, detail_url, actual_times):
+        changes = []
+        for journey in self.journeys:
+            if journey.detail_url != detail_url:
+                continue
+            for stop in (journey.departure, journey.arrival):
+                actual_time = actual_times.get((stop.station.name, stop.time))
+                if actual_time is not None and actual_time != stop.actual_time:
+                    changes.append(DelayChange(stop, stop.actual_time, actual_time))
+                    stop.actual_time = actual_time
+        return changes
+
+    def search_after_missed_at_station(self, station: Station, client=None):
         first_missed_journey = [journey
                                 for journey in self.journeys
                                 if journey.departure.station == station][0]
@@ -72,14 +140,40 @@ class ConnectionDetails(BaseConnection):
         return ConnectionList.search(
             origin=station,
             destination=self.destination.station,
-            time=earliest_departure_time
+            time=earliest_departure_time,
+            client=client
         )
 
-    def update_after_station(self, station: Station, new_part_connection):
+    def rebook(self, station: Station, later_stations=False, candidates=3, max_workers=None, client=None):
+        # searches from every station in parallel, then fetches details of the earliest candidates in parallel
+        stations = [station]
+        if later_stations:
+            departure_stations = [journey.departure.station for journey in self.journeys]
+            stations += departure_stations[departure_stations.index(station) + 1:]
+        with span('rebook.search', stations=len(stations)):
+            searches = run_batch(lambda _: self.search_after_missed_at_station(_, client), stations, max_workers)
+        found = [
+            (connection.destination.actual_time, index, connection)
+            for index, connections in enumerate(searches) if connections is not None
+            for connection in connections
+        ]
+        if not found and searches.errors:
+            raise next(iter(searches.errors.values()))
+        found = sorted(found, key=lambda _: (_[0], _[1]))[:candidates]
+        with span('rebook.details', candidates=len(found)):
+            details = run_batch(lambda _: _[2].get_details(client), found, max_workers)
+        rebookings = [
+            Rebooking(stations[index], connection, connection_details)
+            for (_, index, connection), connection_details in zip(found, details) if connection_details is not None
+        ]
+        return sorted(rebookings, key=lambda _: _.details.destination.actual_time)
+
+    def update_after_station(self, station: Station, new_part_connection, client=None):
+        # new_part_connection may be the details already fetched for it, e.g. those of a Rebooking
+        new_part_connection_details = new_part_connection.get_details(client)
         self.original_journeys = self.journeys[:]
-        start_index_original_journeys = self.transition_stations.index(station) + 1
+        start_index_original_journeys = [journey.departure.station for journey in self.journeys].index(station)
         del self.journeys[start_index_original_journeys:]
-        new_part_connection_details = new_part_connection.get_details()
         self.journeys += new_part_connection_details.journeys
 
     @property
@@ -102,31 +196,94 @@ class ConnectionDetails(BaseConnection):
     def transfers(self):
         return len(self.journeys) - 1
 
-    def get_details(self):
+    def get_details(self, client=None):
         return self
 
 
 class Connection(BaseConnection):
     # todo test data structure
-    def __init__(self, detail_url, origin, destination, transfers, products):
+    __slots__ = ('detail_url', 'origin', 'destination', 'transfers', 'products', 'client')
+
+    def __init__(self, detail_url, origin, destination, transfers, products, client=None):
         self.detail_url = detail_url
         self.origin = origin
         self.destination = destination
         self.transfers = transfers
         self.products = products
+        self.client = client
 
-    def get_details(self) -> ConnectionDetails:
+    @classmethod
+    def from_dict(cls, dct, client=None):
+        return Connection(
+            detail_url=dct['detail_url'],
+            origin=DepartureOrArrival.from_dict(dct['origin']),
+            destination=DepartureOrArrival.from_dict(dct['destination']),
+            transfers=dct['transfers'],
+            products=dct['products'],
+            client=client
+        )
+
+    @property
+    def key(self):
+        # detail urls differ between result pages, so identify connections by their timetable data
+        return (
+            self.origin.time,
+            self.destination.time,
+            self.transfers,
+            frozenset(self.products)
+        )
+
+    def get_details(self, client=None) -> ConnectionDetails:
         # todo test
         # todo different behaviour for 0 or more transitions (bsp. Köln -> Bergisch Gladbach)
-        parser = DetailParser(self.detail_url)
-        return ConnectionDetails.from_list(parser.journeys())
+        with span('get_details'):
+            parser = DetailParser(self.detail_url, client or self.client)
+            return ConnectionDetails.from_list(parser.journeys(), self.detail_url)
+
+    async def aget_details(self, client=None) -> ConnectionDetails:
+        html = await DetailParser.fetch_async(self.detail_url, client)
+        journeys = await run_in_executor(lambda: DetailParser.from_html(html).journeys())
+        return ConnectionDetails.from_list(journeys, self.detail_url)
+
+
+class LazyConnection(Connection):
+    # fields are left unset and extracted from the parsed row on first access, which then fills the slot
+    __slots__ = ('_parser', '_row', '_row_parser')
+    LAZY_FIELDS = ('detail_url', 'origin', 'destination', 'transfers', 'products', '_row_parser')
+
+    def __init__(self, parser, row, client=None):
+        self._parser = parser
+        self._row = row
+        self.client = client
+
+    def __getattr__(self, name):
+        if name not in self.LAZY_FIELDS:
+            raise AttributeError(name)
+        if name == '_row_parser':
+            value = ConnectionRowParser(self._row)
+        elif name == 'origin':
+            value = DepartureOrArrival.from_dict(self._parser.origin(self._row_parser))
+        elif name == 'destination':
+            value = DepartureOrArrival.from_dict(self._parser.destination(self._row_parser))
+        else:
+            value = getattr(self._row_parser, name)
+        setattr(self, name, value)
+        return value
 
 
 class ConnectionList:
-    # todo function to get connection with soonest arrival
     # TODO test data structure
+    SORT_KEYS = {
+        'arrival': lambda connection: (connection.destination.actual_time, connection.origin.time),
+        'departure': lambda connection: (connection.origin.time, connection.destination.actual_time),
+        'duration': lambda connection: (connection.duration, connection.destination.actual_time),
+        'transfers': lambda connection: (connection.transfers, connection.destination.actual_time),
+    }
+
     def __init__(self, connections):
         self.connections = connections
+        # sorted views and product filters are computed once per list, which is not modified after creation
+        self._views = {}
 
     def __str__(self):
         return self.connections.__str__()
@@ -140,28 +297,129 @@ class ConnectionList:
     def __len__(self):
         return len(self.connections)
 
+    def sorted_by(self, key):
+        view = self._views.get(key)
+        if view is None:
+            view = self._views[key] = ConnectionList(sorted(self.connections, key=self.SORT_KEYS[key]))
+            view._views[key] = view
+        return view
+
+    def _first(self, key):
+        view = self.sorted_by(key)
+        return view[0] if view else None
+
+    def earliest_arrival(self):
+        return self._first('arrival')
+
+    def shortest(self):
+        return self._first('duration')
+
+    def fewest_transfers(self):
+        return self._first('transfers')
+
+    def with_products(self, products):
+        # connections using nothing but the given products, in the order of this list
+        products = frozenset(products)
+        view = self._views.get(products)
+        if view is None:
+            view = self._views[products] = ConnectionList(
+                [connection for connection in self.connections if products.issuperset(connection.products)]
+            )
+        return view
+
     @classmethod
-    def search(cls, origin, destination, time=pendulum.now(), only_direct=False):
-        parser = ConnectionListParser(origin, destination, time, only_direct)
-        return cls.from_list(parser.connections)
+    def merge(cls, *connection_lists, key='arrival'):
+        # merges the sorted views of several searches and drops connections found by more than one of them
+        seen = set()
+        connections = []
+        for connection in heapq.merge(*(_.sorted_by(key) for _ in connection_lists), key=cls.SORT_KEYS[key]):
+            if connection.key not in seen:
+                seen.add(connection.key)
+                connections.append(connection)
+        merged = cls(connections)
+        merged._views[key] = merged
+        return merged
+
+    def to_arrays(self):
+        return ConnectionArrays.from_connections(self.connections)
+
+    def to_dataframe(self):
+        return self.to_arrays().to_dataframe()
+
+    def get_all_details(self, max_workers=None, client=None):
+        return run_batch(lambda connection: connection.get_details(client), self.connections, max_workers)
 
     @classmethod
-    def from_list(cls, lst):
+    def search(cls, origin, destination, time=None, only_direct=False, client=None, lazy=False):
+        time = time or pendulum.now()
+        with span('search'):
+            parser = ConnectionListParser(origin, destination, time, only_direct, client)
+            if lazy:
+                return cls.from_parser(parser, client)
+            return cls.from_list(parser.connections, client)
+
+    @classmethod
+    def from_parser(cls, parser, client=None):
+        return cls([LazyConnection(parser, row, client) for row in parser.connection_rows])
+
+    @classmethod
+    def search_many(cls, pairs, time=None, only_direct=False, concurrency=4, rate_limit=None, client=None):
+        time = time or pendulum.now()
+        # pairs naming the same stations are searched once, but every pair as passed in maps to the result
+        queries = OrderedDict((tuple(pair), (str(pair[0]), str(pair[1]))) for pair in pairs)
+        rate_limiter = RateLimiter(rate_limit) if rate_limit else None
+
+        def search(query):
+            if rate_limiter is not None:
+                rate_limiter.acquire()
+            return cls.search(query[0], query[1], time, only_direct, client)
+        results = run_batch(search, OrderedDict.fromkeys(queries.values()), concurrency).by_item()
+        return OrderedDict((pair, results[query]) for pair, query in queries.items())
+
+    @classmethod
+    def iter_search(cls, origin, destination, time=None, until=None, only_direct=False, client=None):
+        time = time or pendulum.now()
+        seen = set()
+        for parser in ConnectionListParser.iter_pages(origin, destination, time, only_direct, client):
+            page = cls.from_list(parser.connections, client)
+            new_connections = [connection for connection in page if connection.key not in seen]
+            if not new_connections:
+                return
+            for connection in new_connections:
+                seen.add(connection.key)
+                if until is None or connection.origin.time <= until:
+                    yield connection
+            # rows are ordered by departure, so later pages can only depart after the last row
+            if until is not None and new_connections[-1].origin.time > until:
+                return
+
+    @classmethod
+    def stream(cls, origin, destination, time=None, only_direct=False, client=None):
+        # yields connections while the result page is still downloading
+        time = time or pendulum.now()
+        for connection in ConnectionListParser.stream(origin, destination, time, only_direct, client):
+            yield Connection.from_dict(connection, client)
+
+    @classmethod
+    async def asearch(cls, origin, destination, time=None, only_direct=False, client=None):
+        time = time or pendulum.now()
+        html = await ConnectionListParser.fetch_async(origin, destination, time, only_direct, client)
+        connections = await run_in_executor(lambda: ConnectionListParser.from_html(html, time).connections)
+        return cls.from_list(connections)
+
+    @classmethod
+    def from_list(cls, lst, client=None):
         # TODO test
-        connections = [
-            Connection(
-                detail_url=connection['detail_url'],
-                origin=DepartureOrArrival.from_dict(connection['origin']),
-                destination=DepartureOrArrival.from_dict(connection['destination']),
-                transfers=connection['transfers'],
-                products=connection['products']
-            )
-            for connection in lst
-        ]
-        return cls(connections)
+        with span('build.connection_list'):
+            connections = [
+                Connection.from_dict(connection, client) for connection in lst
+            ]
+            return cls(connections)
 
 
 class Train:
+    __slots__ = ('type', 'digits')
+
     def __init__(self, number):
         self.type = None
         self.digits = None
@@ -190,6 +448,8 @@ class Train:
 
 
 class DepartureOrArrival:
+    __slots__ = ('station', 'time', 'track', 'actual_time')
+
     def __init__(self, station: Station, time: Pendulum, track=None, actual_time=None):
         self.station = station
         self.time = time
@@ -214,18 +474,22 @@ class DepartureOrArrival:
 
 
 class Journey:
-    def __init__(self, departure: DepartureOrArrival, arrival: DepartureOrArrival, train: Train):
+    __slots__ = ('departure', 'arrival', 'train', 'detail_url')
+
+    def __init__(self, departure: DepartureOrArrival, arrival: DepartureOrArrival, train: Train, detail_url=None):
         self.departure = departure
         self.arrival = arrival
         self.train = train
+        self.detail_url = detail_url
 
     def __str__(self):
         return '{}\n{}\n{}\n'.format(self.train, self.departure, self.arrival)
 
     @classmethod
-    def from_dict(cls, dct):
+    def from_dict(cls, dct, detail_url=None):
         return cls(
             departure=DepartureOrArrival.from_dict(dct['departure']),
             arrival=DepartureOrArrival.from_dict(dct['arrival']),
-            train=Train.from_dict(dct['train'])
+            train=Train.from_dict(dct['train']),
+            detail_url=detail_url
         )
@@ -0,0 +1,171 @@
+from collections import namedtuple
+import itertools
+import threading
+
+import pendulum
+
+from schiene2.batch import run_batch
+from schiene2.client import get_default_client
+from schiene2.instrumentation import span
+from schiene2.models import fetch_actual_times
+
+DelayEvent = namedtuple('DelayEvent', ['key', 'details', 'changes', 'previous_delay', 'delay', 'crossed'])
+
+
+class Tracked:
+    __slots__ = ('key', 'details', 'due')
+
+    def __init__(self, key, details, due):
+        self.key = key
+        self.details = details
+        self.due = due
+
+
+class DelayMonitor:
+    # (seconds until the next departure or arrival, poll interval in seconds), checked in order
+    INTERVALS = ((15 * 60, 60), (60 * 60, 5 * 60), (3 * 3600, 15 * 60))
+    IDLE_INTERVAL = 60 * 60
+    # delay_at_destination thresholds in minutes
+    THRESHOLDS = (5, 15, 30, 60)
+
+    def __init__(self, client=None, max_workers=8, thresholds=THRESHOLDS, intervals=INTERVALS,
+                 idle_interval=IDLE_INTERVAL):
+        self.client = client or get_default_client()
+        self.max_workers = max_workers
+        self.thresholds = tuple(sorted(thresholds))
+        self.intervals = intervals
+        self.idle_interval = idle_interval
+        self.errors = {}
+        self.callback_errors = {}
+        self.poll_error = None
+        self._callbacks = []
+        self._tracked = {}
+        self._keys = itertools.count()
+        self._lock = threading.Lock()
+        self._wakeup = threading.Event()
+        self._stopped = threading.Event()
+        self._thread = None
+
+    def add_callback(self, callback):
+        self._callbacks.append(callback)
+
+    def remove_callback(self, callback):
+        self._callbacks.remove(callback)
+
+    def track(self, details, key=None):
+        key = next(self._keys) if key is None else key
+        with self._lock:
+            # new connections are due on the next poll
+            self._tracked[key] = Tracked(key, details, None)
+        self._wakeup.set()
+        return key
+
+    def untrack(self, key):
+        with self._lock:
+            self._tracked.pop(key, None)
+
+    def __len__(self):
+        return len(self._tracked)
+
+    def __contains__(self, key):
+        return key in self._tracked
+
+    def interval(self, details, now):
+        # poll often shortly before a departure or transfer, rarely otherwise, and not at all once arrived
+        upcoming = [
+            stop.actual_time
+            for journey in details.journeys
+            for stop in (journey.departure, journey.arrival)
+            if stop.actual_time > now
+        ]
+        if not upcoming:
+            return None
+        remaining = (min(upcoming) - now).total_seconds()
+        for until, interval in self.intervals:
+            if remaining <= until:
+                return interval
+        return self.idle_interval
+
+    @staticmethod
+    def is_due(entry, now):
+        return entry.due is None or entry.due <= now
+
+    def crossed_thresholds(self, previous_delay, delay):
+        low, high = sorted((previous_delay.total_seconds() / 60, delay.total_seconds() / 60))
+        return tuple(threshold for threshold in self.thresholds if low < threshold <= high)
+
+    def poll(self, now=None):
+        now = now or pendulum.now()
+        with self._lock:
+            tracked = list(self._tracked.values())
+        due_urls = list(dict.fromkeys(
+            detail_url
+            for entry in tracked if self.is_due(entry, now)
+            for detail_url in entry.details.detail_urls
+        ))
+        with span('monitor.poll', urls=len(due_urls)):
+            batch = run_batch(lambda url: fetch_actual_times(url, self.client), due_urls, self.max_workers)
+        self.errors = {due_urls[index]: error for index, error in batch.errors.items()}
+        pages = {url: actual_times for url, actual_times in zip(due_urls, batch) if actual_times is not None}
+
+        events = []
+        for entry in tracked:
+            # every entry sharing a fetched page is updated, even if it was not due yet
+            urls = [url for url in entry.details.detail_urls if url in pages]
+            if urls:
+                previous_delay = entry.details.delay_at_destination
+                changes = []
+                for url in urls:
+                    changes += entry.details.apply_actual_times(url, pages[url])
+                if changes:
+                    delay = entry.details.delay_at_destination
+                    events.append(DelayEvent(entry.key, entry.details, changes, previous_delay, delay,
+                                             self.crossed_thresholds(previous_delay, delay)))
+            if self.is_due(entry, now) or urls:
+                interval = self.interval(entry.details, now)
+                if interval is None:
+                    self.untrack(entry.key)
+                else:
+                    entry.due = now.add(seconds=interval)
+
+        # a failing callback neither keeps the others from being called nor stops the monitor
+        self.callback_errors = {}
+        for event in events:
+            for callback in list(self._callbacks):
+                try:
+                    callback(event)
+                except Exception as e:
+                    self.callback_errors[(event.key, callback)] = e
+        return events
+
+    def next_due(self):
+        now = pendulum.now()
+        with self._lock:
+            return min((entry.due or now for entry in self._tracked.values()), default=None)
+
+    def run(self):
+        while not self._stopped.is_set():
+            self._wakeup.clear()
+            try:
+                self.poll()
+            except Exception as e:
+                # entries that were due are still due, so wait the shortest interval before trying again
+                self.poll_error = e
+                self._wakeup.wait(self.intervals[0][1] if self.intervals else self.idle_interval)
+                continue
+            self.poll_error = None
+            next_due = self.next_due()
+            timeout = None if next_due is None else max((next_due - pendulum.now()).total_seconds(), 0)
+            self._wakeup.wait(timeout)
+
+    def start(self):
+        self._stopped.clear()
+        self._thread = threading.Thread(target=self.run, name='delay-monitor', daemon=True)
+        self._thread.start()
+
+    def stop(self):
+        self._stopped.set()
+        self._wakeup.set()
+        if self._thread is not None:
+            self._thread.join()
+            self._thread = None
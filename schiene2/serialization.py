@@ -0,0 +1,205 @@
+import struct
+
+import pendulum
+
+from schiene2.instrumentation import span
+from schiene2.models import Connection, ConnectionDetails, ConnectionList, DepartureOrArrival, Journey, Station, Train
+
+# layout: header, string table, body. Strings (station names, tracks, trains, urls, products, timezone names) are
+# stored once and referenced by index + 1, 0 standing for None. Times are epoch seconds in the timezone of their stop.
+MAGIC = b'SCH2'
+VERSION = 1
+CONNECTION_LIST, CONNECTION_DETAILS, JOURNEY = 1, 2, 3
+
+HEADER = struct.Struct('<4sBB')
+COUNT = struct.Struct('<I')
+STRING_LENGTH = struct.Struct('<H')
+# station, timezone, time, actual time, track
+STOP = struct.Struct('<IIqqI')
+# train, detail url
+JOURNEY_FIELDS = struct.Struct('<II')
+# detail url, transfers, number of products
+CONNECTION_FIELDS = struct.Struct('<IHB')
+STRING_REF = struct.Struct('<I')
+NO_ORIGINAL_JOURNEYS = 0xFFFFFFFF
+
+
+class Writer:
+    def __init__(self):
+        self.strings = {}
+        self.parts = []
+
+    def string(self, value):
+        if value is None:
+            return 0
+        return self.strings.setdefault(str(value), len(self.strings)) + 1
+
+    def count(self, value):
+        self.parts.append(COUNT.pack(value))
+
+    def stop(self, stop):
+        self.parts.append(STOP.pack(
+            self.string(stop.station.name),
+            self.string(stop.time.timezone_name),
+            stop.time.int_timestamp,
+            stop.actual_time.int_timestamp,
+            self.string(stop.track),
+        ))
+
+    def journey(self, journey):
+        self.stop(journey.departure)
+        self.stop(journey.arrival)
+        self.parts.append(JOURNEY_FIELDS.pack(self.string(journey.train), self.string(journey.detail_url)))
+
+    def connection(self, connection):
+        products = sorted(connection.products)
+        self.parts.append(CONNECTION_FIELDS.pack(self.string(connection.detail_url), connection.transfers,
+                                                 len(products)))
+        self.stop(connection.origin)
+        self.stop(connection.destination)
+        self.parts.extend(STRING_REF.pack(self.string(product)) for product in products)
+
+    def connection_details(self, details):
+        # journeys shared between journeys and original_journeys are written once and referenced by index
+        table = []
+        indices = {}
+        for journey in details.journeys + (details._original_journeys or []):
+            if id(journey) not in indices:
+                indices[id(journey)] = len(table)
+                table.append(journey)
+        self.count(len(table))
+        for journey in table:
+            self.journey(journey)
+        self.count(len(details.journeys))
+        self.parts.extend(COUNT.pack(indices[id(journey)]) for journey in details.journeys)
+        if details._original_journeys is None:
+            self.count(NO_ORIGINAL_JOURNEYS)
+        else:
+            self.count(len(details._original_journeys))
+            self.parts.extend(COUNT.pack(indices[id(journey)]) for journey in details._original_journeys)
+        self.count(len(details.products))
+        self.parts.extend(STRING_REF.pack(self.string(product)) for product in details.products)
+
+    def getvalue(self, kind):
+        strings = [COUNT.pack(len(self.strings))]
+        for value in self.strings:
+            encoded = value.encode('utf-8')
+            strings.append(STRING_LENGTH.pack(len(encoded)))
+            strings.append(encoded)
+        return b''.join([HEADER.pack(MAGIC, VERSION, kind)] + strings + self.parts)
+
+
+class Reader:
+    def __init__(self, data, client=None):
+        self.data = data
+        self.offset = 0
+        self.client = client
+        self.strings = [None]
+        self._stations = {}
+        self._times = {}
+
+    def unpack(self, fmt):
+        values = fmt.unpack_from(self.data, self.offset)
+        self.offset += fmt.size
+        return values
+
+    def count(self):
+        return self.unpack(COUNT)[0]
+
+    def header(self):
+        magic, version, kind = self.unpack(HEADER)
+        if magic != MAGIC:
+            raise ValueError('not a serialized schiene2 object')
+        if version != VERSION:
+            raise ValueError('unsupported serialization version {}'.format(version))
+        for _ in range(self.count()):
+            length, = self.unpack(STRING_LENGTH)
+            self.strings.append(self.data[self.offset:self.offset + length].decode('utf-8'))
+            self.offset += length
+        return kind
+
+    def station(self, index):
+        station = self._stations.get(index)
+        if station is None:
+            station = self._stations[index] = Station(self.strings[index])
+        return station
+
+    def time(self, timestamp, timezone):
+        # the same few times repeat throughout a result, so each is created once
+        key = (timestamp, timezone)
+        time = self._times.get(key)
+        if time is None:
+            time = self._times[key] = pendulum.from_timestamp(timestamp, tz=self.strings[timezone])
+        return time
+
+    def stop(self):
+        station, timezone, time, actual_time, track = self.unpack(STOP)
+        return DepartureOrArrival(
+            self.station(station),
+            self.time(time, timezone),
+            self.strings[track],
+            self.time(actual_time, timezone)
+        )
+
+    def journey(self):
+        departure = self.stop()
+        arrival = self.stop()
+        train, detail_url = self.unpack(JOURNEY_FIELDS)
+        return Journey(departure, arrival, Train(self.strings[train]), self.strings[detail_url])
+
+    def connection(self):
+        detail_url, transfers, products = self.unpack(CONNECTION_FIELDS)
+        origin = self.stop()
+        destination = self.stop()
+        products = {self.strings[self.unpack(STRING_REF)[0]] for _ in range(products)}
+        return Connection(self.strings[detail_url], origin, destination, transfers, products, self.client)
+
+    def journey_refs(self, table, count):
+        return [table[self.count()] for _ in range(count)]
+
+    def connection_details(self):
+        table = [self.journey() for _ in range(self.count())]
+        details = ConnectionDetails(self.journey_refs(table, self.count()))
+        original_journeys = self.count()
+        if original_journeys != NO_ORIGINAL_JOURNEYS:
+            details.original_journeys = self.journey_refs(table, original_journeys)
+        details.products = [self.strings[self.unpack(STRING_REF)[0]] for _ in range(self.count())]
+        return details
+
+
+def dumps(obj):
+    writer = Writer()
+    with span('serialization.dumps'):
+        if isinstance(obj, ConnectionList):
+            writer.count(len(obj))
+            for connection in obj:
+                writer.connection(connection)
+            return writer.getvalue(CONNECTION_LIST)
+        if isinstance(obj, ConnectionDetails):
+            writer.connection_details(obj)
+            return writer.getvalue(CONNECTION_DETAILS)
+        if isinstance(obj, Journey):
+            writer.journey(obj)
+            return writer.getvalue(JOURNEY)
+    raise TypeError('cannot serialize {}'.format(type(obj).__name__))
+
+
+def loads(data, client=None):
+    reader = Reader(data, client)
+    with span('serialization.loads'):
+        kind = reader.header()
+        if kind == CONNECTION_LIST:
+            return ConnectionList([reader.connection() for _ in range(reader.count())])
+        if kind == CONNECTION_DETAILS:
+            return reader.connection_details()
+        if kind == JOURNEY:
+            return reader.journey()
+    raise ValueError('unknown serialized type {}'.format(kind))
+
+
+def dump(obj, file):
+    file.write(dumps(obj))
+
+
+def load(file, client=None):
+    return loads(file.read(), client)
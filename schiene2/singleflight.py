@@ -0,0 +1,91 @@
+import asyncio
+import threading
+
+
+def flight_key(url, params=None):
+    # unlike cache_key every parameter counts, only identical requests may share a response
+    return url, tuple(sorted((name, str(value)) for name, value in (params or {}).items()))
+
+
+class Call:
+    __slots__ = ('done', 'result', 'error')
+
+    def __init__(self):
+        self.done = threading.Event()
+        self.result = None
+        self.error = None
+
+
+class SingleFlight:
+    # while a call for a key is running, callers with the same key wait for its result instead of repeating it
+    def __init__(self):
+        self.calls = 0
+        self.coalesced = 0
+        self._calls = {}
+        self._lock = threading.Lock()
+
+    def do(self, key, func, *args):
+        with self._lock:
+            call = self._calls.get(key)
+            leader = call is None
+            if leader:
+                call = self._calls[key] = Call()
+                self.calls += 1
+            else:
+                self.coalesced += 1
+        if not leader:
+            call.done.wait()
+            if call.error is not None:
+                raise call.error
+            return call.result
+        try:
+            call.result = func(*args)
+            return call.result
+        except Exception as e:
+            call.error = e
+            raise
+        finally:
+            with self._lock:
+                del self._calls[key]
+            call.done.set()
+
+    @property
+    def stats(self):
+        return {
+            'calls': self.calls,
+            'coalesced': self.coalesced,
+            'in_flight': len(self._calls),
+        }
+
+
+class AsyncSingleFlight:
+    def __init__(self):
+        self.calls = 0
+        self.coalesced = 0
+        self._calls = {}
+
+    async def do(self, key, func, *args):
+        # keyed by loop as well, since a future can only be awaited in the loop it belongs to
+        key = (asyncio.get_event_loop(), key)
+        future = self._calls.get(key)
+        if future is not None:
+            self.coalesced += 1
+            # shielded, so a cancelled follower does not cancel the call for everyone else
+            return await asyncio.shield(future)
+        self.calls += 1
+        future = self._calls[key] = asyncio.ensure_future(func(*args))
+        try:
+            return await asyncio.shield(future)
+        finally:
+            if future.done():
+                self._calls.pop(key, None)
+            else:
+                future.add_done_callback(lambda _: self._calls.pop(key, None))
+
+    @property
+    def stats(self):
+        return {
+            'calls': self.calls,
+            'coalesced': self.coalesced,
+            'in_flight': len(self._calls),
+        }
@@ -0,0 +1,216 @@
+import asyncio
+import random
+import threading
+import time
+import weakref
+
+import requests
+
+# statuses the site answers with when overloaded or briefly unavailable
+TRANSIENT_STATUSES = frozenset([429, 500, 502, 503, 504])
+
+
+class TransientResponseError(IOError):
+    def __init__(self, status, url):
+        super(TransientResponseError, self).__init__('{} answered {}'.format(url, status))
+        self.status = status
+        self.url = url
+
+
+class CircuitOpenError(Exception):
+    pass
+
+
+TRANSIENT_ERRORS = (TransientResponseError, requests.ConnectionError, requests.Timeout, ConnectionError,
+                    TimeoutError, asyncio.TimeoutError)
+
+
+def check_status(status, url):
+    if status in TRANSIENT_STATUSES:
+        raise TransientResponseError(status, url)
+
+
+def async_transient_errors():
+    try:
+        import aiohttp
+    except ImportError:
+        return ()
+    return (aiohttp.ClientConnectionError,)
+
+
+class RateLimiter:
+    def __init__(self, rate, burst=1):
+        self.rate = rate
+        self.capacity = burst
+        self.tokens = burst
+        self.updated = time.monotonic()
+        self._lock = threading.Lock()
+
+    def reserve(self):
+        # takes a token, going into debt if none is left, and returns how long the caller has to wait for it
+        with self._lock:
+            now = time.monotonic()
+            self.tokens = min(self.capacity, self.tokens + (now - self.updated) * self.rate)
+            self.updated = now
+            self.tokens -= 1
+            return max(0.0, -self.tokens / self.rate)
+
+    def acquire(self):
+        wait = self.reserve()
+        if wait:
+            time.sleep(wait)
+
+
+class CircuitBreaker:
+    # opens after failure_threshold consecutive failures and lets a single trial request through every
+    # reset_timeout, closing again once one succeeds
+    def __init__(self, failure_threshold=5, reset_timeout=30):
+        self.failure_threshold = failure_threshold
+        self.reset_timeout = reset_timeout
+        self.failures = 0
+        self.opened = None
+        self._trial = False
+        self._lock = threading.Lock()
+
+    @property
+    def state(self):
+        if self.opened is None:
+            return 'closed'
+        return 'half-open' if self._trial else 'open'
+
+    def allow(self):
+        with self._lock:
+            if self.opened is None:
+                return True
+            now = time.monotonic()
+            if now - self.opened < self.reset_timeout:
+                return False
+            self.opened = now
+            self._trial = True
+            return True
+
+    def record_success(self):
+        with self._lock:
+            self.failures = 0
+            self.opened = None
+            self._trial = False
+
+    def record_failure(self):
+        with self._lock:
+            self.failures += 1
+            if self._trial or self.failures >= self.failure_threshold:
+                self.opened = time.monotonic()
+                self._trial = False
+
+
+class RequestScheduler:
+    def __init__(self, rate=None, burst=1, max_concurrency=None, retries=3, backoff=0.5, max_backoff=30,
+                 failure_threshold=5, reset_timeout=30, retry_on=TRANSIENT_ERRORS):
+        self.rate_limiter = RateLimiter(rate, burst) if rate else None
+        self.max_concurrency = max_concurrency
+        self.retries = retries
+        self.backoff = backoff
+        self.max_backoff = max_backoff
+        self.retry_on = retry_on
+        self.breaker = CircuitBreaker(failure_threshold, reset_timeout)
+        self.metrics = {
+            'requests': 0,
+            'queued': 0,
+            'throttled': 0,
+            'retried': 0,
+            'failed': 0,
+            'rejected': 0,
+            'in_flight': 0,
+        }
+        self._semaphore = threading.BoundedSemaphore(max_concurrency) if max_concurrency else None
+        # asyncio semaphores belong to the loop they are used in
+        self._async_semaphores = weakref.WeakKeyDictionary()
+        self._lock = threading.Lock()
+
+    def _count(self, metric, value=1):
+        with self._lock:
+            self.metrics[metric] += value
+
+    def backoff_delay(self, attempt):
+        # full jitter, so clients failing together do not retry together
+        return random.uniform(0, min(self.max_backoff, self.backoff * 2 ** attempt))
+
+    def _admit(self, attempt):
+        # the breaker counts requests, so retries of an admitted request are not turned away
+        if attempt == 0 and not self.breaker.allow():
+            self._count('rejected')
+            raise CircuitOpenError('too many failed requests, retrying in {}s'.format(self.breaker.reset_timeout))
+        wait = self.rate_limiter.reserve() if self.rate_limiter is not None else 0
+        if wait:
+            self._count('throttled')
+        return wait
+
+    def _failed(self, error, attempt, retry_on):
+        # returns whether to retry
+        if not isinstance(error, retry_on):
+            self._count('failed')
+            return False
+        if attempt == self.retries:
+            self.breaker.record_failure()
+            self._count('failed')
+            return False
+        self._count('retried')
+        return True
+
+    def call(self, func, *args, **kwargs):
+        self._count('requests')
+        for attempt in range(self.retries + 1):
+            wait = self._admit(attempt)
+            if wait:
+                time.sleep(wait)
+            if self._semaphore is not None and not self._semaphore.acquire(blocking=False):
+                self._count('queued')
+                self._semaphore.acquire()
+            self._count('in_flight')
+            try:
+                result = func(*args, **kwargs)
+            except Exception as e:
+                if not self._failed(e, attempt, self.retry_on):
+                    raise
+            else:
+                self.breaker.record_success()
+                return result
+            finally:
+                self._count('in_flight', -1)
+                if self._semaphore is not None:
+                    self._semaphore.release()
+            time.sleep(self.backoff_delay(attempt))
+
+    def _async_semaphore(self):
+        loop = asyncio.get_event_loop()
+        semaphore = self._async_semaphores.get(loop)
+        if semaphore is None:
+            semaphore = self._async_semaphores[loop] = asyncio.Semaphore(self.max_concurrency)
+        return semaphore
+
+    async def acall(self, func, *args, **kwargs):
+        self._count('requests')
+        retry_on = self.retry_on + async_transient_errors()
+        semaphore = self._async_semaphore() if self.max_concurrency else None
+        for attempt in range(self.retries + 1):
+            wait = self._admit(attempt)
+            if wait:
+                await asyncio.sleep(wait)
+            if semaphore is not None and semaphore.locked():
+                self._count('queued')
+            if semaphore is not None:
+                await semaphore.acquire()
+            self._count('in_flight')
+            try:
+                result = await func(*args, **kwargs)
+            except Exception as e:
+                if not self._failed(e, attempt, retry_on):
+                    raise
+            else:
+                self.breaker.record_success()
+                return result
+            finally:
+                self._count('in_flight', -1)
+                if semaphore is not None:
+                    semaphore.release()
+            await asyncio.sleep(self.backoff_delay(attempt))
@@ -0,0 +1,159 @@
+from array import array
+import bisect
+import threading
+
+import pendulum
+
+from schiene2.instrumentation import span
+from schiene2.models import ConnectionDetails, ConnectionList, DepartureOrArrival, Journey, Station
+
+
+class Timetable:
+    # collected legs are kept as elementary connections in parallel arrays sorted by departure, which is what the
+    # connection scan algorithm walks through
+    def __init__(self, min_transfer_time=5 * 60, max_wait=30 * 60):
+        self.min_transfer_time = min_transfer_time
+        # collected legs only answer a search if the route departs within max_wait, beyond it earlier trains that
+        # were never collected may exist
+        self.max_wait = max_wait
+        self.hits = 0
+        self.misses = 0
+        self._station_ids = {}
+        self._stations = []
+        self._train_ids = {}
+        self._keys = set()
+        self._legs = []
+        self._pending = []
+        self._departures = array('q')
+        self._arrivals = array('q')
+        self._departure_stations = array('l')
+        self._arrival_stations = array('l')
+        self._trains = array('l')
+        self._lock = threading.Lock()
+
+    def __len__(self):
+        return len(self._legs) + len(self._pending)
+
+    @property
+    def stations(self):
+        return [Station(name) for name in self._stations]
+
+    def _station_id(self, station):
+        name = str(station)
+        station_id = self._station_ids.get(name)
+        if station_id is None:
+            station_id = self._station_ids[name] = len(self._stations)
+            self._stations.append(name)
+        return station_id
+
+    def add_journey(self, journey):
+        # legs are stored with their scheduled times, the same leg collected twice is kept once
+        key = (journey.departure.station.name, journey.arrival.station.name, journey.departure.time.int_timestamp,
+               journey.arrival.time.int_timestamp, str(journey.train))
+        with self._lock:
+            if key not in self._keys:
+                self._keys.add(key)
+                self._station_id(journey.departure.station)
+                self._station_id(journey.arrival.station)
+                self._pending.append((key, journey))
+
+    def add_details(self, details):
+        for journey in details.journeys + [_ for _ in details.original_journeys if _ not in details.journeys]:
+            self.add_journey(journey)
+
+    def _sort(self):
+        if not self._pending:
+            return
+        with span('timetable.sort', legs=len(self._legs) + len(self._pending)):
+            entries = sorted(
+                [(self._departures[index], index, self._legs[index]) for index in range(len(self._legs))] +
+                [(key[2], len(self._legs) + index, journey) for index, (key, journey) in enumerate(self._pending)],
+                key=lambda _: (_[0], _[1])
+            )
+            self._legs = [journey for _, _, journey in entries]
+            self._pending = []
+            self._departures = array('q', (journey.departure.time.int_timestamp for journey in self._legs))
+            self._arrivals = array('q', (journey.arrival.time.int_timestamp for journey in self._legs))
+            self._departure_stations = array('l', (self._station_id(_.departure.station) for _ in self._legs))
+            self._arrival_stations = array('l', (self._station_id(_.arrival.station) for _ in self._legs))
+            self._trains = array('l', (self._train_ids.setdefault(str(_.train), len(self._train_ids))
+                                       for _ in self._legs))
+
+    def earliest_arrival(self, origin, destination, time):
+        with self._lock:
+            self._sort()
+            origin_id = self._station_ids.get(str(origin))
+            destination_id = self._station_ids.get(str(destination))
+            if origin_id is None or destination_id is None:
+                return None
+            with span('timetable.scan'):
+                legs = self._scan(origin_id, destination_id, time.int_timestamp)
+        if legs is None:
+            return None
+        return ConnectionDetails([
+            Journey(
+                DepartureOrArrival(journey.departure.station, journey.departure.time, journey.departure.track),
+                DepartureOrArrival(journey.arrival.station, journey.arrival.time, journey.arrival.track),
+                journey.train,
+                journey.detail_url
+            )
+            for journey in legs
+        ])
+
+    def _scan(self, origin_id, destination_id, start):
+        earliest = {origin_id: start}
+        arrived_by = {}
+        via = {}
+        departures, arrivals = self._departures, self._arrivals
+        departure_stations, arrival_stations, trains = self._departure_stations, self._arrival_stations, self._trains
+        for index in range(bisect.bisect_left(departures, start), len(departures)):
+            departure = departures[index]
+            if departure > earliest.get(destination_id, departure):
+                break
+            station = departure_stations[index]
+            reached = earliest.get(station)
+            if reached is None:
+                continue
+            # staying on the same train needs no transfer time
+            if station != origin_id and arrived_by.get(station) != trains[index]:
+                reached += self.min_transfer_time
+            if departure < reached:
+                continue
+            arrival_station = arrival_stations[index]
+            if arrivals[index] < earliest.get(arrival_station, arrivals[index] + 1):
+                earliest[arrival_station] = arrivals[index]
+                arrived_by[arrival_station] = trains[index]
+                via[arrival_station] = index
+        if destination_id not in via:
+            return None
+        legs = []
+        station = destination_id
+        while station != origin_id:
+            index = via[station]
+            legs.append(self._legs[index])
+            station = departure_stations[index]
+        return legs[::-1]
+
+    def search(self, origin, destination, time=None, client=None):
+        # answers from the collected legs and falls back to a live search whose details are collected in turn
+        time = time or pendulum.now()
+        details = self.earliest_arrival(origin, destination, time)
+        if details is not None and details.origin.time.int_timestamp - time.int_timestamp <= self.max_wait:
+            self.hits += 1
+            return details
+        self.misses += 1
+        connection = ConnectionList.search(origin, destination, time, client=client).earliest_arrival()
+        if connection is None:
+            return None
+        details = connection.get_details(client)
+        self.add_details(details)
+        return details
+
+    @property
+    def stats(self):
+        return {
+            'hits': self.hits,
+            'misses': self.misses,
+            'legs': len(self),
+            'stations': len(self._stations),
+        }
@@ -20,6 +20,12 @@ setup_requirements = [
     # TODO(lmr2391): put setup requirements (distutils extensions, etc.) here
 ]
 
+extras_requirements = {
+    'async': ['aiohttp'],
+    'lxml': ['lxml'],
+    'analytics': ['numpy', 'pandas'],
+}
+
 test_requirements = [
     'pytest',
     # TODO: put package test requirements here
@@ -36,6 +42,7 @@ setup(
     packages=find_packages(include=['schiene2']),
     include_package_data=True,
     install_requires=requirements,
+    extras_require=extras_requirements,
     license="MIT license",
     zip_safe=False,
     keywords='schiene2',
@@ -1,3 +1,6 @@
+import asyncio
+import json
+
 from betamax import Betamax
 import pendulum
 import pytest
@@ -147,3 +150,21 @@ def new_part_connection2():
             }
         },
     ])
+
+
+def run(coroutine):
+    # asyncio.run only exists from Python 3.7 on
+    loop = asyncio.new_event_loop()
+    try:
+        return loop.run_until_complete(coroutine)
+    finally:
+        loop.close()
+
+
+def cassette_responses(name):
+    with open('tests/cassettes/{}.json'.format(name)) as f:
+        interactions = json.load(f)['http_interactions']
+    return [
+        (interaction['request']['method'], interaction['response']['body']['string'])
+        for interaction in interactions
+    ]
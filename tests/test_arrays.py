@@ -0,0 +1,53 @@
+import pytest
+
+from schiene2.models import ConnectionList
+from tests.test_models import make_connection
+
+numpy = pytest.importorskip('numpy')
+
+
+@pytest.fixture
+def connections():
+    return ConnectionList([
+        make_connection((14, 0), (18, 0), 2, ['ICE', 'S']),
+        make_connection((14, 30), (17, 0), 1, ['ICE'], delay=50),
+        make_connection((15, 0), (17, 30), 0, ['IC'], delay=5),
+    ])
+
+
+class TestConnectionArrays:
+    def test_columns(self, connections):
+        arrays = connections.to_arrays()
+        assert len(arrays) == 3
+        assert arrays.departure[0] == connections[0].origin.time.int_timestamp
+        assert arrays.arrival.dtype == numpy.int64
+        assert list(arrays.transfers) == [2, 1, 0]
+        assert list(arrays.arrival_delay) == [0, 50, 5]
+        assert list(arrays.duration) == [240, 150, 150]
+
+    def test_categorical_codes(self, connections):
+        arrays = connections.to_arrays()
+        assert arrays.stations == ['X']
+        assert list(arrays.origin) == [0, 0, 0]
+        assert sorted(arrays.products) == ['IC', 'ICE', 'S']
+        assert list(arrays.uses_product('ICE')) == [True, True, False]
+        assert not arrays.uses_product('RE').any()
+
+    def test_delay_stats(self, connections):
+        stats = connections.to_arrays().delay_stats(threshold=5, percentiles=(50,))
+        assert stats['count'] == 3
+        assert stats['max'] == 50
+        assert stats['delayed'] == 2
+        assert stats['p50'] == 5
+
+    def test_empty(self):
+        arrays = ConnectionList([]).to_arrays()
+        assert len(arrays) == 0
+        assert arrays.delay_stats() == {'count': 0}
+
+    def test_to_dataframe(self, connections):
+        pytest.importorskip('pandas')
+        frame = connections.to_dataframe()
+        assert list(frame['arrival_delay']) == [0, 50, 5]
+        assert list(frame['origin'].cat.categories) == ['X']
+        assert list(frame['product_S']) == [True, False, False]
@@ -0,0 +1,34 @@
+import time
+
+from schiene2.batch import BatchResult, run_batch
+
+
+def slow_square(number):
+    time.sleep(0.05)
+    if number == 3:
+        raise ValueError(number)
+    return number * number
+
+
+class TestRunBatch:
+    def test_preserves_order(self):
+        result = run_batch(lambda number: number * 2, [3, 1, 2])
+        assert isinstance(result, BatchResult)
+        assert list(result) == [6, 2, 4]
+
+    def test_collects_errors_without_aborting(self):
+        result = run_batch(slow_square, [1, 2, 3, 4])
+        assert result.results == [1, 4, None, 16]
+        assert list(result.errors) == [2]
+        assert isinstance(result.errors[2], ValueError)
+        assert not result.ok
+
+    def test_runs_concurrently(self):
+        result = run_batch(slow_square, [1, 2, 4, 5, 6])
+        assert result.elapsed < 0.2
+        assert all(timing >= 0.05 for timing in result.timings)
+
+    def test_empty(self):
+        result = run_batch(slow_square, [])
+        assert len(result) == 0
+        assert result.ok
@@ -0,0 +1,72 @@
+import json
+
+import pendulum
+
+from benchmarks import bench_serialization, loadtest, run
+from benchmarks.bench_memory import synthetic_rows
+from benchmarks.mock_server import MockServer
+from schiene2.client import Client
+from schiene2.mobile_page import DetailParser
+from schiene2.models import ConnectionList, Station
+
+
+def test_benchmark_suite_runs_offline(tmpdir):
+    output = str(tmpdir.join('benchmark.json'))
+    assert run.main(['--number', '1', '--repeat', '1', '--output', output]) == 0
+    with open(output) as f:
+        report = json.load(f)
+    assert list(report['results']) == list(run.BENCHMARKS)
+    assert all(result['min'] > 0 for result in report['results'].values())
+
+
+def test_compare_flags_regressions():
+    baseline = {'results': {'fast': {'min': 1.0}, 'slow': {'min': 1.0}}}
+    report = {'results': {'fast': {'min': 1.1}, 'slow': {'min': 2.0}, 'new': {'min': 1.0}}}
+    assert run.compare(report, baseline, tolerance=1.2) == ['slow']
+
+
+def test_serialization_benchmark_formats_round_trip():
+    connections = ConnectionList.from_list(list(synthetic_rows(3)))
+    for name, dumps, loads in bench_serialization.FORMATS:
+        assert [connection.key for connection in loads(dumps(connections))] == \
+            [connection.key for connection in connections], name
+
+
+def test_mock_server_pages_parse_consistently():
+    dt = pendulum.create(2017, 12, 17, 14, 30, tz='Europe/Berlin')
+    with MockServer(connections=3) as server:
+        client = Client(session=server.session())
+        connections = ConnectionList.search('Köln Hbf', 'Freiburg Hbf', dt, client=client)
+        details = connections[1].get_details(client)
+        assert ConnectionList.search('Köln Hbf', 'Freiburg Hbf', dt, client=client)[1].key == connections[1].key
+        assert server.requests == 3
+
+    assert len(connections) == 3
+    assert all(connection.origin.time > dt for connection in connections)
+    assert details.origin.station == Station('Köln Hbf')
+    assert details.destination.station == Station('Freiburg Hbf')
+    assert details.origin.time == connections[1].origin.time
+    assert details.destination.actual_time == connections[1].destination.actual_time
+    assert details.transfers == connections[1].transfers
+
+
+def test_loadtest_reports_latencies():
+    result, = loadtest.run(concurrency_levels=(2,), operations=4)
+    assert result['errors'] == 0
+    assert result['search']['count'] == result['get_details']['count'] == 4
+    assert 0 < result['search']['p50'] <= result['search']['p99']
+
+
+def test_streaming_from_mock_server_matches_search():
+    dt = pendulum.create(2017, 12, 17, 14, 30, tz='Europe/Berlin')
+    with MockServer(connections=4) as server:
+        client = Client(session=server.session())
+        streamed = list(ConnectionList.stream('Köln Hbf', 'Freiburg Hbf', dt, client=client))
+        searched = ConnectionList.search('Köln Hbf', 'Freiburg Hbf', dt, client=client)
+        stops = list(DetailParser.stream(searched[0].detail_url, client))
+        details = searched[0].get_details(client)
+
+    assert [connection.key for connection in streamed] == [connection.key for connection in searched]
+    assert stops[0]['station'] == 'Köln Hbf'
+    assert stops[-1]['actual_time'] == details.destination.actual_time
+    assert len(stops) == 2 * len(details.journeys)
@@ -0,0 +1,87 @@
+import pendulum
+import pytest
+
+from unittest.mock import MagicMock
+
+from schiene2.cache import MemoryCache, SQLiteCache, cache_key, is_realtime_request
+from schiene2.client import Client
+from schiene2.mobile_page import ConnectionListParser
+
+
+@pytest.fixture(params=['memory', 'sqlite'])
+def cache(request, tmpdir):
+    if request.param == 'memory':
+        return MemoryCache(maxsize=2)
+    return SQLiteCache(str(tmpdir.join('cache.sqlite')), maxsize=2)
+
+
+def search_params(time='14:30'):
+    return ConnectionListParser.request_params(
+        'Köln Hbf', 'Frankfurt Hbf', pendulum.create(2017, 12, 9, *map(int, time.split(':')))
+    )
+
+
+class TestCacheKey:
+    def test_ignores_param_order_and_whitespace(self):
+        params = search_params()
+        reordered = dict(reversed(list(params.items())))
+        reordered['S'] = ' Köln Hbf '
+        assert cache_key('http://example.com/?', params) == cache_key('http://example.com/?', reordered)
+
+    def test_differs_by_time(self):
+        assert cache_key('http://example.com/?', search_params('14:30')) != \
+            cache_key('http://example.com/?', search_params('14:31'))
+
+    def test_detail_url_is_key(self):
+        assert cache_key('http://example.com/detail') == 'http://example.com/detail'
+
+
+class TestIsRealtimeRequest:
+    def test_detail_pages_are_realtime(self):
+        assert is_realtime_request(None, 3600)
+
+    def test_near_and_far_queries(self):
+        now = pendulum.now('Europe/Berlin')
+        assert is_realtime_request(ConnectionListParser.request_params('A', 'B', now), 3600)
+        assert not is_realtime_request(ConnectionListParser.request_params('A', 'B', now.add(days=2)), 3600)
+
+
+class TestCache:
+    def test_hit_and_miss_counters(self, cache):
+        assert cache.get('a') is None
+        cache.set('a', 'html')
+        assert cache.get('a') == 'html'
+        assert cache.stats == {'hits': 1, 'misses': 1, 'size': 1}
+
+    def test_expired_entries_are_misses(self, cache):
+        cache.realtime_ttl = -1
+        cache.set('a', 'html', realtime=True)
+        assert cache.get('a') is None
+        assert len(cache) == 0
+
+    def test_evicts_least_recently_used(self, cache):
+        cache.set('a', '1')
+        cache.set('b', '2')
+        cache.get('a')
+        cache.set('c', '3')
+        assert cache.get('b') is None
+        assert cache.get('a') == '1'
+        assert cache.get('c') == '3'
+
+    def test_clear(self, cache):
+        cache.set('a', '1')
+        cache.clear()
+        assert len(cache) == 0
+
+
+class TestClientCache:
+    def test_second_request_is_served_from_cache(self):
+        session = MagicMock()
+        session.get.return_value.text = '<html></html>'
+        client = Client(session=session, cache=MemoryCache())
+
+        assert client.get('http://example.com/detail') == '<html></html>'
+        assert client.get('http://example.com/detail') == '<html></html>'
+
+        assert session.get.call_count == 1
+        assert client.cache.stats['hits'] == 1
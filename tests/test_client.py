@@ -0,0 +1,134 @@
+import pendulum
+import pytest
+
+from unittest.mock import MagicMock
+
+from schiene2 import client
+from schiene2.cache import MemoryCache
+from schiene2.client import AsyncClient, Client, get_default_client, set_default_client
+from schiene2.mobile_page import ConnectionListParser, DetailParser
+from schiene2.models import Connection, ConnectionList
+from tests.conftest import cassette_responses, run
+
+
+@pytest.fixture
+def session():
+    session = MagicMock()
+    session.get.return_value.text = '<html></html>'
+    session.post.return_value.text = '<html></html>'
+    return session
+
+
+class TestClient:
+    def test_mounts_pooled_adapters(self):
+        http_client = Client(pool_size=3)
+        adapter = http_client.session.get_adapter('http://mobile.bahn.de/')
+        assert adapter._pool_maxsize == 3
+
+    def test_passes_timeout(self, session):
+        Client(session=session, timeout=2.5).get('http://example.com', params={'a': 1})
+        call_kwargs = session.get.call_args[1]
+        assert call_kwargs['timeout'] == 2.5
+        assert call_kwargs['params'] == {'a': 1}
+
+    def test_default_client_is_shared(self, monkeypatch):
+        monkeypatch.setattr(client, '_default_client', None)
+        assert get_default_client() is get_default_client()
+
+    def test_set_default_client(self, monkeypatch, session):
+        monkeypatch.setattr(client, '_default_client', None)
+        http_client = Client(session=session)
+        set_default_client(http_client)
+        assert get_default_client() is http_client
+
+
+class TestParsersUseClient:
+    def test_connection_list_parser(self, session):
+        ConnectionListParser('Gießen Hbf', 'Waldkirch', pendulum.create(2017, 12, 13, 12, 0),
+                             client=Client(session=session))
+        assert session.get.called
+
+    def test_detail_parser(self, session):
+        DetailParser('http://example.com/detail', client=Client(session=session))
+        assert session.get.call_args[1]['url'] == 'http://example.com/detail'
+
+
+class FakeAsyncResponse:
+    def __init__(self, text):
+        self._text = text
+
+    async def __aenter__(self):
+        return self
+
+    async def __aexit__(self, exc_type, exc_val, exc_tb):
+        pass
+
+    async def text(self):
+        return self._text
+
+
+class FakeAsyncSession:
+    def __init__(self, responses):
+        self.responses = list(responses)
+        self.calls = []
+
+    def request(self, method, url, **kwargs):
+        self.calls.append((method, url, kwargs))
+        expected_method, text = self.responses.pop(0)
+        assert expected_method == method
+        return FakeAsyncResponse(text)
+
+    def get(self, url, **kwargs):
+        return self.request('GET', url, **kwargs)
+
+    def post(self, url, **kwargs):
+        return self.request('POST', url, **kwargs)
+
+
+class TestAsyncClient:
+    def test_asearch_resolves_ambiguous_entry(self):
+        session = FakeAsyncSession(cassette_responses('tests.test_mobile_page.TestConnectionListParser')[:2])
+        dt = pendulum.create(2017, 12, 15, 14, 2, tz='Europe/Berlin')
+
+        connections = run(
+            ConnectionList.asearch('Gießen Hbf', 'Waldkirch', dt, client=AsyncClient(session=session))
+        )
+
+        assert len(connections) == 3
+        assert connections[0].origin.time == pendulum.create(2017, 12, 15, 14, 22, tz='Europe/Berlin')
+        assert session.calls[0][2]['params']['S'] == 'Gießen Hbf'
+        assert session.calls[1][2]['data']['REQ0JourneyStopsZ0K'] == 'S-6N1'
+
+    def test_aget_details_matches_get_details(self):
+        responses = cassette_responses('tests.test_functional.test_functional')
+        session = FakeAsyncSession([responses[1]])
+        connection = Connection('http://example.com/detail', None, None, 2, set())
+
+        details = run(connection.aget_details(AsyncClient(session=session)))
+        expected = DetailParser.from_html(responses[1][1]).journeys()
+
+        assert [journey.departure.station.name for journey in details.journeys] == \
+            [journey['departure']['station'] for journey in expected]
+        assert details.destination.time == expected[-1]['arrival']['time']
+
+    def test_does_not_close_passed_session(self):
+        session = MagicMock()
+        run(AsyncClient(session=session).close())
+        assert not session.close.called
+
+
+class TestClientStream:
+    def test_decodes_chunks_split_inside_characters(self, session):
+        body = 'Gießen Hbf – Köln Hbf'.encode('utf-8')
+        session.get.return_value.encoding = 'utf-8'
+        session.get.return_value.iter_content.return_value = [body[:3], body[3:4], body[4:]]
+
+        assert ''.join(Client(session=session).stream('http://example.com/detail')) == 'Gießen Hbf – Köln Hbf'
+        assert session.get.call_args[1]['stream'] is True
+        assert session.get.return_value.close.called
+
+    def test_uses_cached_page(self, session):
+        cache = MemoryCache()
+        cache.set('http://example.com/detail', 'cached')
+        assert list(Client(session=session, cache=cache).stream('http://example.com/detail')) == ['cached']
+        assert not session.get.called
@@ -1,11 +1,12 @@
 import pendulum
 import pytest
 from schiene2 import ConnectionList, Station
+from schiene2.client import Client
 
 
 @pytest.mark.functional
 def test_functional(betamax_session, monkeypatch):
-    monkeypatch.setattr('schiene2.mobile_page.requests', betamax_session)
+    monkeypatch.setattr('schiene2.client._default_client', Client(session=betamax_session))
 
     # Stephan möchte mit der nächsten Verbindung von Berlin nach
     # nach Bergisch Gladbach fahren und sucht daher die nächsten Verbindungen
@@ -0,0 +1,71 @@
+import pendulum
+import pytest
+
+from schiene2 import instrumentation
+from schiene2.client import Client
+from schiene2.instrumentation import NULL_SPAN, HistogramHook, add_hook, remove_hook, span
+from schiene2.models import ConnectionList
+from tests.replay import ReplaySession
+
+
+@pytest.fixture
+def histogram():
+    hook = HistogramHook()
+    add_hook(hook)
+    yield hook
+    remove_hook(hook)
+
+
+class TestSpan:
+    def test_no_op_without_hooks(self):
+        assert instrumentation._hooks == []
+        assert span('http.get', url='http://example.com') is NULL_SPAN
+
+    def test_hooks_receive_finished_spans(self):
+        spans = []
+        add_hook(spans.append)
+        try:
+            with span('http.get', url='http://example.com'):
+                pass
+        finally:
+            remove_hook(spans.append)
+        assert spans[0].name == 'http.get'
+        assert spans[0].tags == {'url': 'http://example.com'}
+        assert spans[0].duration >= 0
+        assert spans[0].error is None
+
+    def test_errors_are_recorded_and_raised(self, histogram):
+        with pytest.raises(ValueError):
+            with span('parse.detail'):
+                raise ValueError()
+        assert histogram.summary()['parse.detail']['errors'] == 1
+
+
+class TestHistogramHook:
+    def test_percentiles(self):
+        hook = HistogramHook(buckets=(0.01, 0.1, 1))
+        for duration in [0.005] * 98 + [0.5, 2]:
+            finished = instrumentation.Span('http.get', {})
+            finished.duration = duration
+            hook(finished)
+        summary = hook.summary()['http.get']
+        assert summary['count'] == 100
+        assert summary['p50'] == 0.01
+        assert summary['p99'] == 1
+        assert summary['max'] == 2
+
+    def test_search_emits_spans_for_every_phase(self, histogram):
+        client = Client(session=ReplaySession('tests.test_functional.test_functional'))
+        connections = ConnectionList.search(
+            'Berlin Ostbahnhof',
+            'Bergisch Gladbach',
+            pendulum.create(2017, 12, 17, 14, 30, tz='Europe/Berlin'),
+            client=client
+        )
+        connections[1].get_details()
+
+        assert set(histogram.summary()) == {
+            'search', 'http.get', 'parse.connection_list', 'extract.connections', 'build.connection_list',
+            'get_details', 'parse.detail', 'extract.journeys', 'build.connection_details'
+        }
+        assert histogram.summary()['http.get']['count'] == 2
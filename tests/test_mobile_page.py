@@ -6,9 +6,13 @@ from unittest.mock import MagicMock
 
 from _pytest.monkeypatch import MonkeyPatch
 
-from schiene2.mobile_page import ConnectionListParser, ConnectionRowParser, BaseParser
-from schiene2 import mobile_page
+from bs4 import BeautifulSoup
+
+from schiene2.client import Client
+from schiene2.mobile_page import ConnectionListParser, ConnectionRowParser, BaseParser, DetailParser
+from schiene2 import client, mobile_page
 from betamax import Betamax
+from tests.conftest import cassette_responses
 
 
 @pytest.fixture(scope='class')
@@ -24,7 +28,7 @@ def betamax_class_session(request):
 @pytest.fixture(scope='class')
 def parser_recording(betamax_class_session):
     mp = MonkeyPatch()
-    mp.setattr(mobile_page, 'requests', betamax_class_session)
+    mp.setattr(client, '_default_client', Client(session=betamax_class_session))
     yield
     mp.undo()
 
@@ -66,9 +70,8 @@ class MockRequest(MagicMock):
 
 @pytest.fixture
 def mocked_request(monkeypatch):
-    from schiene2 import mobile_page
     mocked_request = MockRequest()
-    monkeypatch.setattr(mobile_page, 'requests', mocked_request)
+    monkeypatch.setattr(client, '_default_client', Client(session=mocked_request))
     return mocked_request
 
 
@@ -172,6 +175,20 @@ class TestConnectionListParser:
         assert connection_parser.actual_origin_time == expected_origin
         assert connection_parser.actual_destination_time == expected_destination
 
+    def test_later_url(self, recorded_parser):
+        assert recorded_parser.later_url.startswith('http://mobile.bahn.de/bin/mobil/query.exe/dox?')
+        assert recorded_parser.later_url.endswith('&e=1&')
+
+    def test_header_fields(self, recorded_parser):
+        assert recorded_parser.header_fields == ('Gießen', 'Waldkirch', '15.12.2017')
+
+    def test_row_delays_are_parsed_once(self, live_parser, mocker):
+        spy = mocker.spy(ConnectionRowParser, '_parse_actual_times')
+        connection_parser = ConnectionRowParser(live_parser.connection_rows[0])
+        connection_parser.actual_origin_time
+        connection_parser.actual_destination_time
+        assert spy.call_count == 1
+
     def test_has_first_timestring_property(self, recorded_parser):
         assert recorded_parser.first_timestring == '14:02'
 
@@ -183,3 +200,107 @@ class TestBaseParser:
         parser.first_timestring = '14:30'
         assert parser.timestring_to_pendulum('15:00') == pendulum.create(2017, 12, 20, 15, 0, tz='Europe/Berlin')
         assert parser.timestring_to_pendulum('14:00') == pendulum.create(2017, 12, 21, 14, 0, tz='Europe/Berlin')
+
+    def test_timestring_to_pendulum_matches_pendulum_parse(self, monkeypatch):
+        monkeypatch.setattr('schiene2.mobile_page.BaseParser.datestring', '26.03.17')
+        parser = BaseParser()
+        parser.first_timestring = '00:00'
+        for hour in range(24):
+            timestring = '{:02}:{:02}'.format(hour, 30)
+            expected = pendulum.parse('26.03.17 ' + timestring, year_first=False, day_first=True, tz='Europe/Berlin')
+            assert parser.timestring_to_pendulum(timestring) == expected
+
+    def test_timestring_to_pendulum_is_memoized(self, monkeypatch):
+        monkeypatch.setattr('schiene2.mobile_page.BaseParser.datestring', '20.12.2017')
+        parser = BaseParser()
+        parser.first_timestring = '14:30'
+        assert parser.timestring_to_pendulum('15:00') is parser.timestring_to_pendulum('15:00')
+
+
+def unstrained_parser(parser_class, html, *args):
+    parser = parser_class.from_html(html, *args)
+    parser.soup = BeautifulSoup(html, 'html.parser')
+    return parser
+
+
+@pytest.fixture(params=['html.parser', 'lxml'])
+def parser_backend(request, monkeypatch):
+    if request.param == 'lxml':
+        pytest.importorskip('lxml')
+    monkeypatch.setattr(mobile_page, '_parser_backend', 'html.parser')
+    mobile_page.set_parser_backend(request.param)
+    return request.param
+
+
+class TestParserBackend:
+    def test_connections_are_identical(self, parser_backend):
+        responses = cassette_responses('tests.test_functional.test_functional')
+        dt = pendulum.create(2017, 12, 17, 14, 30, tz='Europe/Berlin')
+        expected = unstrained_parser(ConnectionListParser, responses[0][1], dt)
+        assert ConnectionListParser.from_html(responses[0][1], dt).connections == expected.connections
+
+    def test_journeys_are_identical(self, parser_backend):
+        responses = cassette_responses('tests.test_functional.test_functional')
+        expected = unstrained_parser(DetailParser, responses[1][1])
+        assert DetailParser.from_html(responses[1][1]).journeys() == expected.journeys()
+
+    def test_ambiguous_entry_form_is_identical(self, parser_backend):
+        html = cassette_responses('tests.test_mobile_page.TestConnectionListParser')[0][1]
+        url, field_values = ConnectionListParser.ambiguous_entry_form(html)
+        assert url.startswith('http://mobile.bahn.de/bin/mobil/query.exe/dox?')
+        assert field_values['REQ0JourneyStopsZ0K'] == 'S-6N1'
+        assert field_values['REQ0JourneyDate'] == '15.12.17'
+        assert 'advancedProductMode' not in field_values
+
+    def test_unknown_backend(self):
+        with pytest.raises(ValueError):
+            mobile_page.set_parser_backend('no-such-parser')
+
+
+def chunked(html, size=512):
+    return [html[index:index + size] for index in range(0, len(html), size)]
+
+
+class TestStreaming:
+    @pytest.mark.parametrize('name, index, dt', [
+        ('tests.test_functional.test_functional', 0, pendulum.create(2017, 12, 17, 14, 30, tz='Europe/Berlin')),
+        ('tests.test_mobile_page.TestConnectionListParser', 1,
+         pendulum.create(2017, 12, 15, 14, 2, tz='Europe/Berlin')),
+        ('tests.test_mobile_page.TestConnectionListParser', 2,
+         pendulum.create(2017, 12, 20, 20, 11, tz='Europe/Berlin')),
+    ])
+    def test_connections_match_full_parse(self, name, index, dt):
+        html = cassette_responses(name)[index][1]
+        streamed = list(ConnectionListParser.from_html('', dt).iter_connections(chunked(html)))
+        assert streamed == ConnectionListParser.from_html(html, dt).connections
+
+    def test_first_connection_is_yielded_before_the_page_is_read(self):
+        html = cassette_responses('tests.test_functional.test_functional')[0][1]
+        chunks = chunked(html)
+        read = []
+
+        def feed():
+            for chunk in chunks:
+                read.append(chunk)
+                yield chunk
+
+        dt = pendulum.create(2017, 12, 17, 14, 30, tz='Europe/Berlin')
+        next(ConnectionListParser.from_html('', dt).iter_connections(feed()))
+        assert len(read) < len(chunks)
+
+    def test_ambiguous_entry_is_resolved(self):
+        responses = cassette_responses('tests.test_mobile_page.TestConnectionListParser')
+        http_client = MagicMock()
+        http_client.post.return_value = responses[1][1]
+        dt = pendulum.create(2017, 12, 15, 14, 2, tz='Europe/Berlin')
+
+        parser = ConnectionListParser.from_html('', dt)
+        streamed = list(parser.iter_connections(chunked(responses[0][1]), http_client))
+
+        assert http_client.post.call_args[0][1]['REQ0JourneyStopsZ0K'] == 'S-6N1'
+        assert streamed == ConnectionListParser.from_html(responses[1][1], dt).connections
+
+    def test_stops_match_full_parse(self):
+        html = cassette_responses('tests.test_functional.test_functional')[1][1]
+        streamed = list(DetailParser.from_html('').iter_stops(chunked(html, 100)))
+        assert streamed == DetailParser.from_html(html).departure_or_arrivals()
@@ -1,7 +1,15 @@
+import pickle
 import pytest
 import pendulum
 
+from unittest.mock import MagicMock
+
+from schiene2.client import Client
+from schiene2.mobile_page import ConnectionListParser, DetailParser
 from schiene2.models import ConnectionDetails, ConnectionList, DepartureOrArrival, Train, Station, Journey
+from schiene2.models import Connection, DelayChange, LazyConnection
+from tests.conftest import cassette_responses
+from tests.replay import ReplaySession
 
 
 @pytest.fixture
@@ -56,6 +64,36 @@ class TestStation:
         station3 = Station('Freiburg')
         assert station1 != station3
 
+    def test_stations_are_interned_by_name(self):
+        assert Station('Freiburg Hbf') is Station(name='Freiburg Hbf')
+        assert Station('Freiburg Hbf') is not Station('Freiburg')
+
+    def test_stations_are_hashable(self):
+        stations = {Station('Freiburg Hbf'), Station('Freiburg Hbf'), Station('Köln Hbf')}
+        assert len(stations) == 2
+
+    def test_stations_compare_with_other_types(self):
+        assert Station('Freiburg Hbf') != 'Freiburg Hbf'
+        assert 'Freiburg Hbf' not in {Station('Freiburg Hbf')}
+        assert Station('Freiburg Hbf') not in {'Freiburg Hbf': 1}
+
+    def test_pickle_keeps_interning(self):
+        station = Station('Freiburg Hbf')
+        assert pickle.loads(pickle.dumps(station)) is station
+
+
+class TestSlots:
+    def test_models_have_no_instance_dict(self, complete_connection):
+        journey = complete_connection.journeys[0]
+        for obj in (complete_connection, journey, journey.departure, journey.train, journey.departure.station):
+            assert not hasattr(obj, '__dict__')
+
+    def test_pickle_round_trip(self, complete_connection):
+        restored = pickle.loads(pickle.dumps(complete_connection))
+        assert restored.transition_stations == complete_connection.transition_stations
+        assert str(restored.journeys[2].train) == 'RE 123'
+        assert restored.delay_at_destination == complete_connection.delay_at_destination
+
 
 class TestJourney:
     def test_can_create_from_dict(self):
@@ -140,6 +178,69 @@ class TestConnectionDetails:
         assert call_kwargs['destination'] == complete_connection.destination.station
         assert call_kwargs['time'] > complete_connection.journeys[1].departure.time
 
+    def test_rebook_searches_remaining_stations_and_ranks_by_arrival(self, complete_connection, new_part_connection,
+                                                                     new_part_connection2, mocker):
+        frankfurt, freiburg = complete_connection.transition_stations
+        results = {frankfurt: [new_part_connection], freiburg: [new_part_connection2]}
+        mock_search = mocker.patch('schiene2.models.ConnectionList.search',
+                                   side_effect=lambda origin, **kwargs: results[origin])
+
+        rebookings = complete_connection.rebook(frankfurt, later_stations=True)
+
+        assert mock_search.call_count == 2
+        assert [rebooking.station for rebooking in rebookings] == [frankfurt, freiburg]
+        assert rebookings[0].details is new_part_connection
+        complete_connection.update_after_station(rebookings[0].station, rebookings[0].details)
+        assert complete_connection.destination is new_part_connection.destination
+
+    def test_rebooking_details_are_not_fetched_again(self, complete_connection, new_part_connection, mocker):
+        connection = Connection('http://example.com/detail', new_part_connection.origin,
+                                new_part_connection.destination, 0, {'RE'})
+        mocker.patch('schiene2.models.ConnectionList.search', return_value=[connection])
+        detail_parser = mocker.patch('schiene2.models.DetailParser')
+        detail_parser.return_value.journeys.return_value = [
+            {'departure': {'station': 'Frankfurt Hbf', 'time': new_part_connection.origin.time, 'track': 8},
+             'arrival': {'station': 'Hinterzarten', 'time': new_part_connection.destination.time, 'track': 1},
+             'train': {'number': 'RE 236'}}
+        ]
+        client = MagicMock()
+
+        rebooking, = complete_connection.rebook(Station('Frankfurt Hbf'), client=client)
+        complete_connection.update_after_station(rebooking.station, rebooking.details)
+
+        detail_parser.assert_called_once_with('http://example.com/detail', client)
+        assert complete_connection.destination.station == Station('Hinterzarten')
+        assert complete_connection.destination.time == new_part_connection.destination.time
+
+    def test_update_after_station_fetches_with_client(self, complete_connection, new_part_connection, mocker):
+        connection = Connection('http://example.com/detail', None, None, 0, set())
+        get_details = mocker.patch.object(Connection, 'get_details', return_value=new_part_connection)
+        client = MagicMock()
+
+        complete_connection.update_after_station(Station('Frankfurt Hbf'), connection, client)
+
+        get_details.assert_called_once_with(client)
+        assert complete_connection.journeys[1:] == new_part_connection.journeys
+
+    def test_rebook_from_origin_searches_every_station(self, complete_connection, new_part_connection, mocker):
+        mock_search = mocker.patch('schiene2.models.ConnectionList.search', return_value=[new_part_connection])
+
+        rebookings = complete_connection.rebook(complete_connection.origin.station, later_stations=True)
+
+        searched = [call[1]['origin'] for call in mock_search.call_args_list]
+        assert sorted(searched, key=str) == [Station('Frankfurt Hbf'), Station('Freiburg Hbf'), Station('Köln Hbf')]
+        assert len(rebookings) == 3
+
+    def test_rebook_limits_candidates(self, complete_connection, new_part_connection, new_part_connection2, mocker):
+        mocker.patch('schiene2.models.ConnectionList.search', return_value=[new_part_connection2, new_part_connection])
+        rebookings = complete_connection.rebook(complete_connection.transition_stations[0], candidates=1)
+        assert [rebooking.details for rebooking in rebookings] == [new_part_connection]
+
+    def test_rebook_raises_if_every_search_fails(self, complete_connection, mocker):
+        mocker.patch('schiene2.models.ConnectionList.search', side_effect=IOError('down'))
+        with pytest.raises(IOError):
+            complete_connection.rebook(complete_connection.transition_stations[0])
+
     def test_can_update_after_train_missed(self, complete_connection, new_part_connection):
         original_journeys = complete_connection.journeys[:]
         station = complete_connection.transition_stations[0]
@@ -210,3 +311,231 @@ class TestConnectionList:
             pendulum.create(2017, 12, 9, 14, 57)
         )
         assert isinstance(connection, ConnectionList)
+
+    def test_get_all_details(self, mocker, complete_connection):
+        connections = ConnectionList.from_list([
+            {
+                'detail_url': 'http://example.com/{}'.format(index),
+                'transfers': 2,
+                'products': {'ICE'},
+                'origin': {'station': 'Köln Hbf', 'time': pendulum.create(2017, 12, 9, 13, 11)},
+                'destination': {'station': 'Hinterzarten', 'time': pendulum.create(2017, 12, 9, 17, 55)},
+            }
+            for index in range(3)
+        ])
+        get_details = mocker.patch('schiene2.models.Connection.get_details', return_value=complete_connection)
+
+        details = connections.get_all_details(max_workers=3)
+
+        assert details.results == [complete_connection] * 3
+        assert details.ok
+        assert get_details.call_count == 3
+
+    def test_search_many(self, mocker):
+        def search(origin, destination, time, only_direct, client):
+            if destination == 'Nowhere':
+                raise ValueError(destination)
+            return ConnectionList([])
+        mock_search = mocker.patch('schiene2.models.ConnectionList.search', side_effect=search)
+        pairs = [
+            ('Köln Hbf', 'Frankfurt Hbf'),
+            (Station('Köln Hbf'), Station('Frankfurt Hbf')),
+            ('Köln Hbf', 'Nowhere'),
+        ]
+
+        results = ConnectionList.search_many(pairs, pendulum.create(2017, 12, 9, 14, 57), rate_limit=100)
+
+        assert mock_search.call_count == 2
+        assert list(results) == pairs
+        assert results[Station('Köln Hbf'), Station('Frankfurt Hbf')] is results['Köln Hbf', 'Frankfurt Hbf']
+        assert isinstance(results['Köln Hbf', 'Frankfurt Hbf'].result, ConnectionList)
+        assert results['Köln Hbf', 'Frankfurt Hbf'].error is None
+        assert isinstance(results['Köln Hbf', 'Nowhere'].error, ValueError)
+        assert results['Köln Hbf', 'Nowhere'].elapsed >= 0
+
+    def test_search_many_defaults_to_the_current_time(self, mocker):
+        mock_search = mocker.patch('schiene2.models.ConnectionList.search', return_value=ConnectionList([]))
+        now = pendulum.create(2017, 12, 9, 14, 57)
+        mocker.patch('pendulum.now', return_value=now)
+
+        ConnectionList.search_many([('Köln Hbf', 'Frankfurt Hbf')])
+
+        assert mock_search.call_args[0][2] is now
+
+
+def make_connection(departure, arrival, transfers, products, delay=0):
+    def stop(hour, minute, delay=0):
+        time = pendulum.create(2017, 12, 17, hour, minute, tz='Europe/Berlin')
+        return DepartureOrArrival(Station('X'), time, actual_time=time.add(minutes=delay))
+    return Connection(None, stop(*departure), stop(*arrival, delay=delay), transfers, set(products))
+
+
+class TestConnectionListQueries:
+    @pytest.fixture
+    def connections(self):
+        return ConnectionList([
+            make_connection((14, 0), (18, 0), 2, ['ICE', 'S']),
+            make_connection((14, 30), (17, 0), 1, ['ICE'], delay=50),
+            make_connection((15, 0), (17, 30), 0, ['IC']),
+            make_connection((15, 30), (17, 20), 3, ['RE', 'S']),
+        ])
+
+    def test_earliest_arrival_uses_actual_time(self, connections):
+        assert connections.earliest_arrival() is connections[3]
+
+    def test_shortest(self, connections):
+        assert connections.shortest() is connections[3]
+
+    def test_fewest_transfers(self, connections):
+        assert connections.fewest_transfers() is connections[2]
+
+    def test_sorted_views_are_cached(self, connections):
+        view = connections.sorted_by('arrival')
+        assert connections.sorted_by('arrival') is view
+        assert view.sorted_by('arrival') is view
+        assert list(view) == [connections[3], connections[2], connections[1], connections[0]]
+        assert connections[0].transfers == 2
+
+    def test_with_products(self, connections):
+        assert list(connections.with_products(['ICE', 'S'])) == [connections[0], connections[1]]
+        assert connections.with_products({'S', 'ICE'}) is connections.with_products(['ICE', 'S'])
+        assert connections.with_products(['ICE', 'S']).earliest_arrival() is connections[1]
+
+    def test_empty_list(self):
+        assert ConnectionList([]).earliest_arrival() is None
+
+    def test_merge_keeps_order_and_drops_duplicates(self, connections):
+        other = ConnectionList([
+            make_connection((15, 0), (17, 30), 0, ['IC']),
+            make_connection((16, 0), (17, 10), 0, ['IC']),
+        ])
+        merged = ConnectionList.merge(connections, other)
+        assert [connection.destination.actual_time.format('%H:%M') for connection in merged] == \
+            ['17:10', '17:20', '17:30', '17:50', '18:00']
+        assert merged.sorted_by('arrival') is merged
+
+
+@pytest.fixture
+def paged_client():
+    responses = cassette_responses('tests.test_functional.test_functional')
+    session = MagicMock()
+    session.get.return_value.text = ''
+    session.get.side_effect = [
+        MagicMock(text=responses[0][1]),
+        MagicMock(text=responses[2][1]),
+        MagicMock(text=responses[0][1]),
+    ]
+    return Client(session=session)
+
+
+class TestIterSearch:
+    time = pendulum.create(2017, 12, 17, 14, 30, tz='Europe/Berlin')
+
+    def test_follows_later_pages_and_skips_duplicates(self, paged_client):
+        connections = list(ConnectionList.iter_search('Berlin Ostbahnhof', 'Bergisch Gladbach', self.time,
+                                                      client=paged_client))
+        assert len(connections) == 11
+        assert len(set(connection.key for connection in connections)) == 11
+        assert paged_client.session.get.call_count == 3
+        assert paged_client.session.get.call_args_list[1][1]['url'].endswith('&e=1&')
+
+    def test_fetches_pages_lazily(self, paged_client):
+        connections = ConnectionList.iter_search('Berlin Ostbahnhof', 'Bergisch Gladbach', self.time,
+                                                 client=paged_client)
+        next(connections)
+        assert paged_client.session.get.call_count == 1
+
+    def test_stops_at_until(self, paged_client):
+        until = pendulum.create(2017, 12, 17, 15, 0, tz='Europe/Berlin')
+        connections = list(ConnectionList.iter_search('Berlin Ostbahnhof', 'Bergisch Gladbach', self.time,
+                                                      until=until, client=paged_client))
+        assert [connection.origin.time.strftime('%H:%M') for connection in connections] == \
+            ['14:31', '14:31', '14:50']
+        assert paged_client.session.get.call_count == 1
+
+
+class TestLazyConnection:
+    @pytest.fixture
+    def parser(self):
+        responses = cassette_responses('tests.test_functional.test_functional')
+        dt = pendulum.create(2017, 12, 17, 14, 30, tz='Europe/Berlin')
+        return ConnectionListParser.from_html(responses[0][1], dt)
+
+    def test_matches_eager_connections(self, parser):
+        eager = ConnectionList.from_list(parser.connections)
+        lazy = ConnectionList.from_parser(parser)
+        assert len(lazy) == len(eager)
+        for lazy_connection, eager_connection in zip(lazy, eager):
+            assert isinstance(lazy_connection, Connection)
+            assert str(lazy_connection) == str(eager_connection)
+            assert lazy_connection.detail_url == eager_connection.detail_url
+            assert lazy_connection.key == eager_connection.key
+            assert lazy_connection.origin.actual_time == eager_connection.origin.actual_time
+            assert lazy_connection.destination.station == eager_connection.destination.station
+
+    def test_fields_are_computed_on_first_access_only(self, parser, mocker):
+        spy = mocker.spy(ConnectionListParser, 'timestring_to_pendulum')
+        connection = ConnectionList.from_parser(parser)[0]
+
+        connection.detail_url
+        connection.transfers
+        assert spy.call_count == 0
+
+        origin = connection.origin
+        assert spy.call_count == 2
+        assert connection.origin is origin
+        assert spy.call_count == 2
+
+    def test_unknown_attributes_raise(self, parser):
+        with pytest.raises(AttributeError):
+            ConnectionList.from_parser(parser)[0].no_such_field
+
+    def test_search_can_be_lazy(self):
+        client = Client(session=ReplaySession('tests.test_functional.test_functional'))
+        connections = ConnectionList.search('Berlin Ostbahnhof', 'Bergisch Gladbach',
+                                            pendulum.create(2017, 12, 17, 14, 30, tz='Europe/Berlin'),
+                                            client=client, lazy=True)
+        assert isinstance(connections[1], LazyConnection)
+        details = connections[1].get_details()
+        assert details.transition_stations == [Station('Berlin Hbf (tief)'), Station('Köln Hbf')]
+
+
+class TestRefreshDelays:
+    @pytest.fixture
+    def html(self):
+        return cassette_responses('tests.test_functional.test_functional')[1][1]
+
+    @pytest.fixture
+    def client(self, html):
+        client = MagicMock()
+        client.get.return_value = html
+        return client
+
+    def test_updates_actual_times_in_place(self, html, client):
+        details = ConnectionDetails.from_list(DetailParser.from_html(html).journeys(), 'http://example.com/detail')
+        arrival = details.journeys[1].arrival
+        delayed = arrival.actual_time
+        arrival.actual_time = arrival.time
+        original_journeys = details.original_journeys
+
+        changes = details.refresh_delays(client)
+
+        assert changes == [DelayChange(arrival, arrival.time, delayed)]
+        assert details.journeys[1].arrival is arrival
+        assert arrival.actual_time == delayed
+        assert details.original_journeys is original_journeys
+        client.get.assert_called_once_with('http://example.com/detail')
+
+    def test_reports_nothing_if_unchanged(self, html, client):
+        details = ConnectionDetails.from_list(DetailParser.from_html(html).journeys(), 'http://example.com/detail')
+        assert details.refresh_delays(client) == []
+
+    def test_skips_journeys_without_detail_url(self, html, client):
+        details = ConnectionDetails.from_list(DetailParser.from_html(html).journeys())
+        assert details.refresh_delays(client) == []
+        assert not client.get.called
+
+    def test_get_details_remembers_detail_url(self, mocker, html):
+        mocker.patch.object(DetailParser, '__init__', lambda self, url, client=None: self.parse(html))
+        details = Connection('http://example.com/detail', None, None, 2, set()).get_details()
+        assert {journey.detail_url for journey in details.journeys} == {'http://example.com/detail'}
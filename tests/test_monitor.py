@@ -0,0 +1,151 @@
+import pendulum
+import pytest
+import threading
+
+from unittest.mock import MagicMock
+
+from schiene2.mobile_page import DetailParser
+from schiene2.models import ConnectionDetails
+from schiene2.monitor import DelayMonitor
+from tests.conftest import cassette_responses
+
+DETAIL_URL = 'http://example.com/detail'
+
+
+@pytest.fixture
+def html():
+    return cassette_responses('tests.test_functional.test_functional')[1][1]
+
+
+@pytest.fixture
+def client(html):
+    client = MagicMock()
+    client.get.return_value = html
+    return client
+
+
+@pytest.fixture
+def make_details(html):
+    def make_details():
+        details = ConnectionDetails.from_list(DetailParser.from_html(html).journeys(), DETAIL_URL)
+        # pretend the 2 minutes delay at Köln Hbf is not known yet
+        arrival = details.journeys[1].arrival
+        arrival.actual_time = arrival.time
+        return details
+    return make_details
+
+
+def at(hour, minute):
+    return pendulum.create(2017, 12, 17, hour, minute, tz='Europe/Berlin')
+
+
+class TestDelayMonitor:
+    def test_coalesces_requests_for_the_same_detail_url(self, client, make_details):
+        monitor = DelayMonitor(client)
+        first, second = make_details(), make_details()
+        monitor.track(first)
+        monitor.track(second)
+
+        events = monitor.poll(at(14, 0))
+
+        client.get.assert_called_once_with(DETAIL_URL)
+        assert [event.details for event in events] == [first, second]
+        assert first.journeys[1].arrival.actual_time == at(19, 11)
+
+    def test_emits_events_to_callbacks(self, client, make_details):
+        monitor = DelayMonitor(client, thresholds=(5, 15))
+        received = []
+        monitor.add_callback(received.append)
+        details = make_details()
+        # a stale delay at the destination which the page no longer reports
+        details.destination.actual_time = details.destination.time.add(minutes=10)
+        key = monitor.track(details)
+
+        monitor.poll(at(14, 0))
+
+        event, = received
+        assert event.key == key
+        assert event.previous_delay.total_seconds() == 600
+        assert event.delay.total_seconds() == 0
+        assert event.crossed == (5,)
+        assert [change.stop for change in event.changes] == [details.journeys[1].arrival, details.destination]
+
+    def test_failing_callback_is_recorded(self, client, make_details):
+        monitor = DelayMonitor(client)
+        received = []
+        error = ValueError('broken callback')
+
+        def failing(event):
+            raise error
+        monitor.add_callback(failing)
+        monitor.add_callback(received.append)
+        key = monitor.track(make_details())
+
+        events = monitor.poll(at(14, 0))
+
+        assert received == events
+        assert monitor.callback_errors == {(key, failing): error}
+
+    def test_no_events_without_changes(self, client, make_details):
+        monitor = DelayMonitor(client)
+        monitor.track(make_details())
+        monitor.poll(at(14, 0))
+        assert monitor.poll(at(23, 0)) == []
+
+    def test_polls_only_due_connections(self, client, make_details):
+        monitor = DelayMonitor(client)
+        monitor.track(make_details())
+        monitor.poll(at(14, 0))
+        monitor.poll(at(14, 1))
+        assert client.get.call_count == 1
+
+    def test_untracks_arrived_connections(self, client, make_details):
+        monitor = DelayMonitor(client)
+        key = monitor.track(make_details())
+        monitor.poll(at(20, 0))
+        assert key not in monitor
+
+    def test_interval_adapts_to_next_stop(self, make_details):
+        monitor = DelayMonitor(MagicMock())
+        details = make_details()
+        assert monitor.interval(details, at(14, 25)) == 60
+        assert monitor.interval(details, at(13, 45)) == 5 * 60
+        assert monitor.interval(details, at(10, 0)) == monitor.idle_interval
+        assert monitor.interval(details, at(20, 0)) is None
+
+    def test_records_fetch_errors(self, make_details):
+        client = MagicMock()
+        client.get.side_effect = IOError('down')
+        monitor = DelayMonitor(client)
+        key = monitor.track(make_details())
+
+        assert monitor.poll(at(14, 0)) == []
+        assert isinstance(monitor.errors[DETAIL_URL], IOError)
+        assert key in monitor
+
+    def test_background_thread(self, client, make_details):
+        monitor = DelayMonitor(client)
+        monitor.start()
+        try:
+            monitor.track(make_details())
+        finally:
+            monitor.stop()
+        assert client.get.call_count <= 1
+
+    def test_background_thread_survives_failing_polls(self, client):
+        monitor = DelayMonitor(client, intervals=((0, 0.01),))
+        polled = threading.Event()
+        calls = []
+
+        def poll():
+            calls.append(None)
+            if len(calls) < 3:
+                raise RuntimeError('broken')
+            polled.set()
+        monitor.poll = poll
+        monitor.start()
+        try:
+            assert polled.wait(5)
+        finally:
+            monitor.stop()
+        assert len(calls) == 3
@@ -0,0 +1,90 @@
+import io
+import pendulum
+import pytest
+
+from schiene2 import serialization
+from schiene2.mobile_page import ConnectionListParser, DetailParser
+from schiene2.models import ConnectionDetails, ConnectionList, LazyConnection
+from tests.conftest import cassette_responses
+
+
+@pytest.fixture
+def responses():
+    return cassette_responses('tests.test_functional.test_functional')
+
+
+@pytest.fixture
+def connections(responses):
+    dt = pendulum.create(2017, 12, 17, 14, 30, tz='Europe/Berlin')
+    return ConnectionList.from_list(ConnectionListParser.from_html(responses[0][1], dt).connections)
+
+
+@pytest.fixture
+def details(responses):
+    return ConnectionDetails.from_list(DetailParser.from_html(responses[1][1]).journeys(), 'http://example.com/detail')
+
+
+def assert_same_stop(loaded, stop):
+    assert loaded.station is stop.station
+    assert loaded.time == stop.time
+    assert loaded.time.timezone_name == stop.time.timezone_name
+    assert loaded.actual_time == stop.actual_time
+    assert loaded.track == stop.track
+
+
+def assert_same_journey(loaded, journey):
+    assert_same_stop(loaded.departure, journey.departure)
+    assert_same_stop(loaded.arrival, journey.arrival)
+    assert str(loaded.train) == str(journey.train)
+    assert loaded.detail_url == journey.detail_url
+
+
+class TestSerialization:
+    def test_connection_list_round_trip(self, connections):
+        loaded = serialization.loads(serialization.dumps(connections))
+        assert len(loaded) == len(connections)
+        for loaded_connection, connection in zip(loaded, connections):
+            assert loaded_connection.detail_url == connection.detail_url
+            assert loaded_connection.key == connection.key
+            assert_same_stop(loaded_connection.origin, connection.origin)
+            assert_same_stop(loaded_connection.destination, connection.destination)
+
+    def test_lazy_connections_are_materialized(self, responses):
+        dt = pendulum.create(2017, 12, 17, 14, 30, tz='Europe/Berlin')
+        lazy = ConnectionList.from_parser(ConnectionListParser.from_html(responses[0][1], dt))
+        assert isinstance(lazy[0], LazyConnection)
+        loaded = serialization.loads(serialization.dumps(lazy))
+        assert [connection.key for connection in loaded] == [connection.key for connection in lazy]
+
+    def test_connection_details_round_trip(self, details):
+        loaded = serialization.loads(serialization.dumps(details))
+        assert len(loaded.journeys) == len(details.journeys)
+        for loaded_journey, journey in zip(loaded.journeys, details.journeys):
+            assert_same_journey(loaded_journey, journey)
+        assert loaded.delay_at_destination == details.delay_at_destination
+
+    def test_keeps_original_journeys(self, complete_connection, new_part_connection):
+        complete_connection.update_after_station(complete_connection.transition_stations[0], new_part_connection)
+        loaded = serialization.loads(serialization.dumps(complete_connection))
+        assert len(loaded.original_journeys) == 3
+        assert loaded.original_journeys[0] is loaded.journeys[0]
+        assert loaded.delay_at_destination == complete_connection.delay_at_destination
+        assert loaded.original_journeys[2].arrival.actual_time == \
+            complete_connection.original_journeys[2].arrival.actual_time
+
+    def test_journey_round_trip(self, details):
+        assert_same_journey(serialization.loads(serialization.dumps(details.journeys[1])), details.journeys[1])
+
+    def test_file_round_trip(self, connections):
+        file = io.BytesIO()
+        serialization.dump(connections, file)
+        file.seek(0)
+        assert len(serialization.load(file)) == len(connections)
+
+    def test_rejects_foreign_data(self):
+        with pytest.raises(ValueError):
+            serialization.loads(b'not serialized')
+
+    def test_rejects_unknown_objects(self):
+        with pytest.raises(TypeError):
+            serialization.dumps(object())
@@ -0,0 +1,124 @@
+import asyncio
+import time
+
+from concurrent.futures import ThreadPoolExecutor
+from unittest.mock import MagicMock
+
+from schiene2.client import AsyncClient, Client
+from schiene2.singleflight import AsyncSingleFlight, SingleFlight
+from tests.conftest import run
+from tests.test_client import FakeAsyncResponse
+
+
+def slow(result, calls, delay=0.05):
+    def func(*args):
+        calls.append(args)
+        time.sleep(delay)
+        if isinstance(result, Exception):
+            raise result
+        return result
+    return func
+
+
+class TestSingleFlight:
+    def test_concurrent_calls_are_coalesced(self):
+        single_flight = SingleFlight()
+        calls = []
+        func = slow('html', calls)
+        with ThreadPoolExecutor(max_workers=5) as executor:
+            results = list(executor.map(lambda _: single_flight.do('key', func), range(5)))
+        assert results == ['html'] * 5
+        assert len(calls) == 1
+        assert single_flight.stats == {'calls': 1, 'coalesced': 4, 'in_flight': 0}
+
+    def test_errors_reach_every_caller(self):
+        single_flight = SingleFlight()
+        calls = []
+        func = slow(IOError('down'), calls)
+        with ThreadPoolExecutor(max_workers=3) as executor:
+            futures = [executor.submit(single_flight.do, 'key', func) for _ in range(3)]
+        for future in futures:
+            assert isinstance(future.exception(), IOError)
+        assert len(calls) == 1
+
+    def test_different_keys_and_later_calls_are_not_coalesced(self):
+        single_flight = SingleFlight()
+        calls = []
+        func = slow('html', calls, delay=0)
+        single_flight.do('a', func)
+        single_flight.do('a', func)
+        single_flight.do('b', func)
+        assert len(calls) == 3
+        assert single_flight.stats['coalesced'] == 0
+
+
+class TestAsyncSingleFlight:
+    def test_concurrent_calls_are_coalesced(self):
+        single_flight = AsyncSingleFlight()
+        calls = []
+
+        async def func():
+            calls.append(None)
+            await asyncio.sleep(0.01)
+            return 'html'
+
+        async def main():
+            return await asyncio.gather(*(single_flight.do('key', func) for _ in range(5)))
+
+        assert run(main()) == ['html'] * 5
+        assert len(calls) == 1
+        assert single_flight.stats == {'calls': 1, 'coalesced': 4, 'in_flight': 0}
+
+    def test_errors_reach_every_caller(self):
+        single_flight = AsyncSingleFlight()
+
+        async def func():
+            await asyncio.sleep(0.01)
+            raise IOError('down')
+
+        async def main():
+            return await asyncio.gather(*(single_flight.do('key', func) for _ in range(3)), return_exceptions=True)
+
+        assert all(isinstance(result, IOError) for result in run(main()))
+
+
+class TestClientCoalescing:
+    def test_identical_gets_share_one_request(self):
+        calls = []
+        session = MagicMock()
+        session.get.side_effect = lambda **kwargs: slow(MagicMock(status_code=200, text='html'), calls)()
+        client = Client(session=session)
+        params = {'S': 'Köln Hbf', 'Z': 'Freiburg Hbf', 'date': '17.12.17', 'time': '14:30'}
+        with ThreadPoolExecutor(max_workers=4) as executor:
+            results = list(executor.map(lambda _: client.get('http://example.com', params), range(4)))
+        assert results == ['html'] * 4
+        assert session.get.call_count == 1
+        assert client.single_flight.stats['coalesced'] == 3
+
+    def test_gets_differing_in_any_param_are_not_coalesced(self):
+        calls = []
+        session = MagicMock()
+
+        def get(params, **kwargs):
+            return slow(MagicMock(status_code=200, text=params['a']), calls)()
+        session.get.side_effect = get
+        client = Client(session=session)
+        with ThreadPoolExecutor(max_workers=2) as executor:
+            results = list(executor.map(lambda a: client.get('http://example.com', {'a': a}), ['1', '2']))
+        assert results == ['1', '2']
+        assert session.get.call_count == 2
+
+    def test_can_be_disabled(self):
+        assert Client(session=MagicMock(), coalesce=False).single_flight is None
+
+    def test_async_identical_gets_share_one_request(self):
+        session = MagicMock()
+        session.get.return_value = FakeAsyncResponse('html')
+        client = AsyncClient(session=session)
+
+        async def main():
+            return await asyncio.gather(*(client.get('http://example.com/detail') for _ in range(3)))
+
+        assert run(main()) == ['html'] * 3
+        assert session.get.call_count == 1
+        assert client.single_flight.stats['coalesced'] == 2
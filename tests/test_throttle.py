@@ -0,0 +1,178 @@
+import asyncio
+import threading
+import time
+import pytest
+
+from unittest.mock import MagicMock
+
+from schiene2 import client
+from schiene2.client import AsyncClient, Client, get_default_client
+from schiene2.throttle import CircuitBreaker, CircuitOpenError, RateLimiter, RequestScheduler, \
+    TransientResponseError, check_status
+from tests.conftest import run
+from tests.test_client import FakeAsyncSession
+
+
+class TestRateLimiter:
+    def test_allows_burst_without_waiting(self):
+        rate_limiter = RateLimiter(rate=1, burst=3)
+        started = time.monotonic()
+        for _ in range(3):
+            rate_limiter.acquire()
+        assert time.monotonic() - started < 0.05
+
+    def test_waits_for_tokens(self):
+        rate_limiter = RateLimiter(rate=50)
+        started = time.monotonic()
+        for _ in range(6):
+            rate_limiter.acquire()
+        assert time.monotonic() - started >= 0.09
+
+    def test_reserve_returns_wait(self):
+        rate_limiter = RateLimiter(rate=10)
+        assert rate_limiter.reserve() == 0
+        assert rate_limiter.reserve() == pytest.approx(0.1, abs=0.01)
+        assert rate_limiter.reserve() == pytest.approx(0.2, abs=0.01)
+
+
+def flaky(failures, error=ConnectionError):
+    calls = []
+
+    def func():
+        calls.append(None)
+        if len(calls) <= failures:
+            raise error('down')
+        return 'html'
+    func.calls = calls
+    return func
+
+
+class TestRequestScheduler:
+    def test_retries_transient_errors(self):
+        scheduler = RequestScheduler(retries=3, backoff=0)
+        func = flaky(2)
+        assert scheduler.call(func) == 'html'
+        assert len(func.calls) == 3
+        assert scheduler.metrics['retried'] == 2
+        assert scheduler.metrics['failed'] == 0
+
+    def test_gives_up_after_retries(self):
+        scheduler = RequestScheduler(retries=1, backoff=0)
+        func = flaky(5)
+        with pytest.raises(ConnectionError):
+            scheduler.call(func)
+        assert len(func.calls) == 2
+        assert scheduler.metrics['failed'] == 1
+
+    def test_does_not_retry_other_errors(self):
+        scheduler = RequestScheduler(backoff=0)
+        func = flaky(1, ValueError)
+        with pytest.raises(ValueError):
+            scheduler.call(func)
+        assert len(func.calls) == 1
+
+    def test_backoff_is_jittered_and_capped(self):
+        scheduler = RequestScheduler(backoff=1, max_backoff=5)
+        delays = [scheduler.backoff_delay(10) for _ in range(50)]
+        assert all(0 <= delay <= 5 for delay in delays)
+        assert len(set(delays)) > 1
+
+    def test_circuit_opens_and_recovers(self):
+        scheduler = RequestScheduler(retries=0, failure_threshold=2, reset_timeout=0.05)
+        for _ in range(2):
+            with pytest.raises(ConnectionError):
+                scheduler.call(flaky(1))
+        assert scheduler.breaker.state == 'open'
+        with pytest.raises(CircuitOpenError):
+            scheduler.call(flaky(0))
+        assert scheduler.metrics['rejected'] == 1
+
+        time.sleep(0.06)
+        assert scheduler.call(flaky(0)) == 'html'
+        assert scheduler.breaker.state == 'closed'
+
+    def test_circuit_counts_requests_not_attempts(self):
+        scheduler = RequestScheduler(backoff=0)
+
+        def unavailable():
+            check_status(503, 'http://example.com')
+        for _ in range(2):
+            with pytest.raises(TransientResponseError):
+                scheduler.call(unavailable)
+        assert scheduler.breaker.state == 'closed'
+        assert scheduler.breaker.failures == 2
+        assert scheduler.metrics['failed'] == 2
+        assert scheduler.metrics['rejected'] == 0
+
+    def test_failed_trial_reopens_circuit(self):
+        breaker = CircuitBreaker(failure_threshold=1, reset_timeout=0)
+        breaker.record_failure()
+        assert breaker.allow()
+        assert breaker.state == 'half-open'
+        breaker.record_failure()
+        assert breaker.state == 'open'
+
+    def test_bounds_concurrency(self):
+        scheduler = RequestScheduler(max_concurrency=2)
+        active = []
+        peak = []
+        lock = threading.Lock()
+
+        def func():
+            with lock:
+                active.append(None)
+                peak.append(len(active))
+            time.sleep(0.02)
+            with lock:
+                active.pop()
+
+        threads = [threading.Thread(target=scheduler.call, args=(func,)) for _ in range(6)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        assert max(peak) == 2
+        assert scheduler.metrics['queued'] > 0
+        assert scheduler.metrics['in_flight'] == 0
+
+    def test_counts_throttled_requests(self):
+        scheduler = RequestScheduler(rate=100)
+        for _ in range(3):
+            scheduler.call(lambda: None)
+        assert scheduler.metrics['throttled'] == 2
+
+    def test_async_retries(self):
+        scheduler = RequestScheduler(backoff=0, max_concurrency=1)
+        func = flaky(1, asyncio.TimeoutError)
+
+        async def call():
+            return func()
+
+        assert run(scheduler.acall(call)) == 'html'
+        assert scheduler.metrics['retried'] == 1
+
+
+class TestClientScheduling:
+    def test_retries_overloaded_responses(self):
+        session = MagicMock()
+        overloaded, ok = MagicMock(status_code=503), MagicMock(status_code=200, text='html')
+        session.get.side_effect = [overloaded, ok]
+        scheduler = RequestScheduler(backoff=0)
+        assert Client(session=session, scheduler=scheduler).get('http://example.com') == 'html'
+        assert scheduler.metrics['retried'] == 1
+
+    def test_overloaded_response_raises_without_scheduler(self):
+        session = MagicMock()
+        session.post.return_value.status_code = 429
+        with pytest.raises(TransientResponseError):
+            Client(session=session).post('http://example.com', {})
+
+    def test_async_client_uses_scheduler(self):
+        scheduler = RequestScheduler()
+        session = FakeAsyncSession([('GET', 'html')])
+        assert run(AsyncClient(session=session, scheduler=scheduler).get('http://example.com')) == 'html'
+        assert scheduler.metrics['requests'] == 1
+
+    def test_default_client_is_scheduled(self, monkeypatch):
+        monkeypatch.setattr(client, '_default_client', None)
+        assert isinstance(get_default_client().scheduler, RequestScheduler)
@@ -0,0 +1,88 @@
+import pendulum
+import pytest
+
+from unittest.mock import MagicMock
+
+from schiene2.models import DepartureOrArrival, Journey, Station, Train
+from schiene2.timetable import Timetable
+
+
+def at(hour, minute):
+    return pendulum.create(2017, 12, 9, hour, minute)
+
+
+def leg(origin, departure, destination, arrival, train):
+    return Journey(DepartureOrArrival(Station(origin), at(*departure)),
+                   DepartureOrArrival(Station(destination), at(*arrival)), Train(train))
+
+
+@pytest.fixture
+def timetable(complete_connection, new_part_connection):
+    timetable = Timetable()
+    timetable.add_details(complete_connection)
+    timetable.add_details(new_part_connection)
+    return timetable
+
+
+def route(details):
+    return [(str(journey.departure.station), journey.departure.time.strftime('%H:%M'), str(journey.train))
+            for journey in details.journeys]
+
+
+class TestTimetable:
+    def test_collects_legs_once(self, timetable, complete_connection):
+        timetable.add_details(complete_connection)
+        assert len(timetable) == 5
+        assert Station('Hinterzarten') in timetable.stations
+
+    def test_earliest_arrival(self, timetable):
+        details = timetable.earliest_arrival('Köln Hbf', 'Hinterzarten', at(13, 0))
+        assert route(details) == [('Köln Hbf', '13:11', 'ICE 293'), ('Frankfurt Hbf', '14:45', 'ICE 293'),
+                                  ('Freiburg Hbf', '17:10', 'RE 123')]
+        assert details.destination.time == at(17, 55)
+        assert details.delay_at_destination.total_seconds() == 0
+
+    def test_later_departure_takes_later_connection(self, timetable):
+        details = timetable.earliest_arrival('Frankfurt Hbf', 'Hinterzarten', at(15, 0))
+        assert route(details) == [('Frankfurt Hbf', '15:45', 'RE 236'), ('Freiburg Hbf', '18:22', 'RE 236')]
+
+    def test_respects_transfer_time(self):
+        timetable = Timetable(min_transfer_time=10 * 60)
+        timetable.add_journey(leg('A', (10, 0), 'B', (11, 0), 'RE 1'))
+        timetable.add_journey(leg('B', (11, 5), 'C', (12, 0), 'RE 2'))
+        timetable.add_journey(leg('B', (11, 20), 'C', (12, 30), 'RE 3'))
+        timetable.add_journey(leg('B', (11, 1), 'C', (12, 10), 'RE 1'))
+        assert route(timetable.earliest_arrival('A', 'C', at(9, 0))) == [('A', '10:00', 'RE 1'), ('B', '11:01', 'RE 1')]
+
+    def test_unknown_or_unreachable(self, timetable):
+        assert timetable.earliest_arrival('Köln Hbf', 'Basel SBB', at(13, 0)) is None
+        assert timetable.earliest_arrival('Köln Hbf', 'Hinterzarten', at(14, 0)) is None
+
+    def test_search_uses_collected_legs(self, timetable, mocker):
+        search = mocker.patch('schiene2.timetable.ConnectionList.search')
+        assert timetable.search('Köln Hbf', 'Hinterzarten', at(13, 0)) is not None
+        assert not search.called
+        assert timetable.stats['hits'] == 1
+
+    def test_search_beyond_max_wait_falls_back_to_network(self, timetable, new_part_connection, mocker):
+        connection = MagicMock()
+        connection.get_details.return_value = new_part_connection
+        search = mocker.patch('schiene2.timetable.ConnectionList.search')
+        search.return_value.earliest_arrival.return_value = connection
+
+        assert timetable.earliest_arrival('Köln Hbf', 'Hinterzarten', at(8, 0)) is not None
+        assert timetable.search('Köln Hbf', 'Hinterzarten', at(8, 0)) is new_part_connection
+        assert search.call_count == 1
+        assert timetable.stats['misses'] == 1
+
+    def test_search_falls_back_to_network(self, new_part_connection2, mocker):
+        connection = MagicMock()
+        connection.get_details.return_value = new_part_connection2
+        search = mocker.patch('schiene2.timetable.ConnectionList.search')
+        search.return_value.earliest_arrival.return_value = connection
+        timetable = Timetable()
+
+        assert timetable.search('Freiburg Hbf', 'Hinterzarten', at(19, 0)) is new_part_connection2
+        assert timetable.search('Freiburg Hbf', 'Hinterzarten', at(19, 0)) is not new_part_connection2
+        assert search.call_count == 1
+        assert timetable.stats['misses'] == 1 and timetable.stats['hits'] == 1